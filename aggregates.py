@@ -0,0 +1,32 @@
+import datetime
+
+import pandas as pd
+
+ROLLUP_COLS = ["Calories", "Water"]
+
+
+def daily_rollup(rows, start, end):
+    # one row per calendar day in [start, end]; days without entries are 0
+    df = pd.DataFrame(rows, columns=["Date"] + ROLLUP_COLS)
+    df["Date"] = pd.to_datetime(df["Date"])
+    for col in ROLLUP_COLS:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    idx = pd.date_range(start, end, freq="D", name="Date")
+    return df.set_index("Date").reindex(idx).fillna(0.0)
+
+
+def weekly_rollup(daily):
+    # weeks run Monday to Sunday and are labelled by their Monday
+    weeks = daily.assign(ActiveDays=(daily["Calories"] > 0).astype(int)).resample("W-MON", label="left", closed="left")
+    out = weeks.agg({"Calories": "sum", "Water": "sum", "ActiveDays": "sum"})
+    out.insert(1, "AvgCalories", weeks["Calories"].mean())
+    out.index.name = "Week"
+    return out
+
+
+def user_progress(store, email, days, today=None):
+    today = today or datetime.date.today()
+    start = today - datetime.timedelta(days=days - 1)
+    rows = store.daily_totals(email, start.isoformat(), today.isoformat())
+    daily = daily_rollup(rows, start, today)
+    return daily, weekly_rollup(daily)
@@ -0,0 +1,123 @@
+import base64
+import hashlib
+import os
+from io import BytesIO
+
+from fileio import atomic_write
+from storage.images import content_key, variant_key
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow ships with streamlit, but variants stay optional
+    Image = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+STATIC_URL = "app/static"
+
+# what Pillow raises for bytes it cannot decode (UnidentifiedImageError is an OSError)
+_DECODE_ERRORS = (OSError, ValueError, SyntaxError) + ((Image.DecompressionBombError,) if Image else ())
+
+# square WebP thumbnails kept next to every profile picture
+PROFILE_THUMB_SIZES = (72, 140)
+
+MIME_TYPES = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".webp": "image/webp"}
+
+
+def _variant(data, ext, max_width=None, webp=False):
+    # resized / re-encoded copy; falls back to the original bytes
+    if Image is None or not (max_width or webp):
+        return data, ext
+    try:
+        img = Image.open(BytesIO(data))
+        img.load()
+        if max_width and img.width > max_width:
+            img = img.resize((max_width, round(img.height * max_width / img.width)), Image.LANCZOS)
+        out = BytesIO()
+        if webp:
+            img.save(out, format="WEBP", quality=80, method=6)
+            return out.getvalue(), ".webp"
+        fmt = "PNG" if ext == ".png" else "JPEG"
+        if fmt == "JPEG" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        img.save(out, format=fmt, optimize=True, **({"quality": 85} if fmt == "JPEG" else {}))
+        return out.getvalue(), ext
+    except Exception:
+        return data, ext
+
+
+def publish_asset(path, max_width=None, webp=False, static_dir=STATIC_DIR):
+    # Writes the asset into static/ under a content-hashed name, so the URL
+    # changes whenever the bytes do and browsers may cache it indefinitely.
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        data = f.read()
+    ext = os.path.splitext(path)[1].lower()
+    data, ext = _variant(data, ext, max_width, webp)
+    stem = "".join(c if c.isalnum() else "-" for c in os.path.splitext(os.path.basename(path))[0]).strip("-")
+    name = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+    target = os.path.join(static_dir, name)
+    if not os.path.exists(target):
+        os.makedirs(static_dir, exist_ok=True)
+        atomic_write(target, lambda f: f.write(data), binary=True)
+    return name
+
+
+def asset_url(name, static_serving=True, static_dir=STATIC_DIR):
+    if not name:
+        return None
+    if static_serving:
+        return f"{STATIC_URL}/{name}"
+    # static serving disabled: inline the (already shrunk) variant instead
+    with open(os.path.join(static_dir, name), "rb") as f:
+        b64 = base64.b64encode(f.read()).decode()
+    return f"data:{MIME_TYPES.get(os.path.splitext(name)[1], 'application/octet-stream')};base64,{b64}"
+
+
+# -------------------- Thumbnails --------------------
+def make_thumbnail(data, size):
+    # center-cropped square WebP of size x size; original bytes without Pillow
+    if Image is None:
+        return data
+    img = Image.open(BytesIO(data))
+    img.load()
+    side = min(img.size)
+    left, top = (img.width - side) // 2, (img.height - side) // 2
+    img = img.crop((left, top, left + side, top + side)).resize((size, size), Image.LANCZOS)
+    if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA")
+    out = BytesIO()
+    img.save(out, format="WEBP", quality=85, method=6)
+    return out.getvalue()
+
+
+class BadImage(ValueError):
+    # an upload Pillow cannot decode: corrupt, truncated or not an image
+    pass
+
+
+def make_thumbnails(data, sizes=PROFILE_THUMB_SIZES):
+    # {size: thumbnail}, all built before any is returned
+    try:
+        return {size: make_thumbnail(data, size) for size in sizes}
+    except _DECODE_ERRORS as e:
+        raise BadImage(f"not a readable image: {e}") from e
+
+
+def thumb_key(key, size):
+    return variant_key(key, f"_{size}.webp")
+
+
+def put_profile_image(images, writer, data, ext):
+    # Stores a picture under the hash of its bytes through `writer` (anything
+    # with put_image) and returns the key. Thumbnails go before the original,
+    # so once the original exists its thumbnails do too. A picture already in
+    # `images` writes nothing; one that does not decode raises BadImage before
+    # anything is written.
+    key = content_key(data, ext)
+    if images.etag(key) is None:
+        for size, thumb in make_thumbnails(data).items():
+            writer.put_image(thumb_key(key, size), thumb)
+        writer.put_image(key, data)
+    return key
+
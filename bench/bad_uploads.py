@@ -0,0 +1,85 @@
+# Profile picture uploads that are not readable images: a non-image file, a
+# truncated PNG, a PNG with a corrupted body and an empty file go through the
+# same put path as the Profile page, then the user's ProfileS3Key and the
+# picture store are checked. Exits non-zero if a bad upload changed the key or
+# wrote anything. Needs Pillow (without it no upload is decoded at all).
+#
+#   python bench/bad_uploads.py
+import json
+import os
+import shutil
+import sys
+import tempfile
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from assets import BadImage, Image, put_profile_image  # noqa: E402
+from datasets import USER_COLS  # noqa: E402
+from storage import WriteBehind, open_storage  # noqa: E402
+
+
+def png_bytes():
+    out = BytesIO()
+    Image.new("RGB", (200, 120), (200, 80, 40)).save(out, format="PNG")
+    return out.getvalue()
+
+
+def files(root):
+    return sorted(os.path.relpath(os.path.join(d, f), root) for d, _, fs in os.walk(root) for f in fs)
+
+
+def main():
+    if Image is None:
+        print(json.dumps({"bench": "bad_uploads", "skipped": "Pillow is not installed", "ok": True}))
+        return
+
+    d = tempfile.mkdtemp(prefix="nutra-uploads-")
+    storage = open_storage("sqlite", USER_COLS, db_path=os.path.join(d, "nutra.db"),
+                           users_csv=os.path.join(d, "users.csv"), profiles_dir=os.path.join(d, "profiles"))
+    writer = WriteBehind(storage).start()
+    email = "pic@example.com"
+    storage.users.add({"Name": "pic", "Email": email, "Password": "x"})
+
+    # a good picture first, as the Profile page would store it
+    good = png_bytes()
+    key = put_profile_image(storage.images, writer, good, ".png")
+    writer.update_user(email, {"ProfileS3Key": key})
+    writer.flush(timeout=30)
+    before = files(storage.images.root)
+
+    bad = {
+        "not_an_image": b"%PDF-1.4 definitely not a picture",
+        "truncated_png": good[: len(good) // 3],
+        "corrupt_png": good[:64] + bytes(len(good) - 64),
+        "empty": b"",
+    }
+    results = {}
+    for name, data in bad.items():
+        # main.save_profile_image: a BadImage shows st.error and returns None,
+        # so the Profile page never calls update_user
+        try:
+            saved = put_profile_image(storage.images, writer, data, ".png")
+            writer.update_user(email, {"ProfileS3Key": saved})
+            results[name] = "accepted"
+        except BadImage:
+            results[name] = "rejected"
+    writer.flush(timeout=30)
+    after = files(storage.images.root)
+    stored_key = storage.users.get(email)["ProfileS3Key"]
+    writer.close()
+
+    ok = (all(r == "rejected" for r in results.values()) and stored_key == key and after == before)
+    print(json.dumps({
+        "bench": "bad_uploads",
+        "uploads": results,
+        "profile_key_unchanged": stored_key == key,
+        "files_written": len(after) - len(before),
+        "ok": ok,
+    }))
+    shutil.rmtree(d, ignore_errors=True)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
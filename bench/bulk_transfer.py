@@ -0,0 +1,102 @@
+# Bulk import/export (transfer.py) on a large CSV: import time and peak RSS
+# growth, a second import of the same file (all duplicates), a full export,
+# and the latency of a concurrent session logging intake while the import
+# runs. Uses the sqlite backend with an archive, as the app does.
+#
+#   python bench/bulk_transfer.py [--rows 2000000] [--users 1000] [--chunksize 5000]
+import argparse
+import datetime
+import json
+import os
+import random
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datasets import ITEMS, user_email  # noqa: E402
+from storage import IntakeArchive, IntakeStore  # noqa: E402
+from transfer import export_intake, import_intake  # noqa: E402
+
+
+def rss_mb():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def write_csv(path, rows, users, rng):
+    today = datetime.date.today()
+    with open(path, "w") as f:
+        f.write("Email,Date,Item,Calories\n")
+        for _ in range(rows):
+            day = today - datetime.timedelta(days=rng.randrange(365))
+            f.write(f"{user_email(rng.randrange(users))},{day.isoformat()},{rng.choice(ITEMS)},{rng.randint(50, 900)}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--chunksize", type=int, default=5000)
+    args = parser.parse_args()
+
+    d = tempfile.mkdtemp(prefix="nutra-transfer-")
+    src = os.path.join(d, "import.csv")
+    write_csv(src, args.rows, args.users, random.Random(3))
+    store = IntakeStore(os.path.join(d, "nutra.db"), IntakeArchive(os.path.join(d, "archive")))
+
+    # another session adding an entry every 10 ms for as long as the import runs
+    done = threading.Event()
+    latencies = []
+
+    def session():
+        other = IntakeStore(os.path.join(d, "nutra.db"))
+        while not done.is_set():
+            start = time.perf_counter()
+            other.add("live@bench.example", datetime.date.today().isoformat(), "live", 1)
+            latencies.append((time.perf_counter() - start) * 1000)
+            time.sleep(0.01)
+
+    t = threading.Thread(target=session)
+    t.start()
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    report = import_intake(store, src, chunksize=args.chunksize)
+    import_s = time.perf_counter() - start
+    done.set()
+    t.join()
+    rss_import = rss_mb() - rss_before
+
+    start = time.perf_counter()
+    again = import_intake(store, src, chunksize=args.chunksize)
+    reimport_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    out_bytes = sum(len(text) for text in export_intake(store))
+    export_s = time.perf_counter() - start
+
+    latencies.sort()
+    results = {
+        "file_mb": round(os.path.getsize(src) / 2**20, 1),
+        "import": {**report, "s": round(import_s, 2), "rows_per_s": round(report["rows"] / import_s), "rss_growth_mb": round(rss_import, 1)},
+        "reimport": {**again, "s": round(reimport_s, 2)},
+        "export": {"mb": round(out_bytes / 2**20, 1), "s": round(export_s, 2)},
+        "concurrent_add": {
+            "ops": len(latencies),
+            "p50_ms": round(statistics.median(latencies), 2) if latencies else None,
+            "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 2) if latencies else None,
+            "max_ms": round(latencies[-1], 2) if latencies else None,
+        },
+        "rss_peak_mb": round(rss_mb(), 1),
+    }
+    shutil.rmtree(d, ignore_errors=True)
+    print(json.dumps({"bench": "bulk_transfer", "rows": args.rows, "chunksize": args.chunksize, "results": results}))
+
+
+if __name__ == "__main__":
+    main()
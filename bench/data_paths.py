@@ -0,0 +1,126 @@
+# Latency of the data paths behind the app's helpers, on a synthetic dataset
+# (see datasets.py), for either storage backend. main.py is a Streamlit script
+# and cannot be imported, so each op repeats the calls its helper makes:
+#
+#   save_user          users.exists + hash_in_pool + users.add
+#   authenticate       users.get + check_login
+#   add_intake         intake.add
+#   get_today_intake   intake.for_day
+#   touch_user_streak  streaks.touch
+#   progress_Nd        aggregates.user_progress (daily + weekly rollup)
+#   history_180d       intake.history (hot table, plus the Parquet archive)
+#   targets_all_users  users.frame + nutrition.user_targets over every user
+#
+#   python bench/data_paths.py [--users 10000] [--rows 1000000] [--ops 500] [--backend sqlite] [--compact] [--data DIR]
+#
+# --compact first moves every month but the last two into the archive (sqlite).
+#
+# --data reuses (and writes into) an existing dataset instead of building one;
+# pass the --users and --backend it was built with.
+import argparse
+import datetime
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aggregates import user_progress  # noqa: E402
+from nutrition import user_targets  # noqa: E402
+from datasets import BENCH_PASSWORD, HEAVY_USER, make_dataset, open_dataset, user_email  # noqa: E402
+from security import check_login, hash_in_pool  # noqa: E402
+from storage import BACKENDS, Compactor  # noqa: E402
+
+# scrypt is deliberately slow, so the password paths get fewer iterations
+HASH_OPS = 20
+
+
+def measure(fn, ops):
+    timings = []
+    for i in range(ops):
+        start = time.perf_counter()
+        fn(i)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "ops": ops,
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[min(ops - 1, int(ops * 0.95))], 3),
+        "mean_ms": round(statistics.fmean(timings), 3),
+        "ops_per_s": round(1000 * ops / sum(timings), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--ops", type=int, default=500)
+    parser.add_argument("--backend", choices=BACKENDS, default="sqlite")
+    parser.add_argument("--compact", action="store_true")
+    parser.add_argument("--data")
+    args = parser.parse_args()
+
+    d = args.data or tempfile.mkdtemp(prefix="nutra-data-")
+    dataset = None
+    if not args.data:
+        dataset = make_dataset(d, args.users, args.rows, backend=args.backend)
+    rng = random.Random(2)
+    today = datetime.date.today()
+    n_users = args.users
+
+    # a fresh process: open the stores and look up the first user
+    start = time.perf_counter()
+    storage = open_dataset(d, args.backend)
+    repo, store, streaks = storage.users, storage.intake, storage.streaks
+    repo.get(HEAVY_USER)
+    store.for_day(HEAVY_USER, today.isoformat())
+    results = {"open_cold": {"ms": round((time.perf_counter() - start) * 1000, 1)}}
+    if args.compact and getattr(store, "archive", None) is not None:
+        start = time.perf_counter()
+        moved = Compactor(store).run_once()
+        results["compact"] = {"rows": moved, "ms": round((time.perf_counter() - start) * 1000, 1)}
+
+    def save_user(i):
+        email = f"new{i}-{time.time_ns()}@bench.example"
+        if not repo.exists(email):
+            repo.add({"Name": "New", "Email": email, "Password": hash_in_pool(BENCH_PASSWORD)})
+
+    def authenticate(i):
+        rec = repo.get(user_email(rng.randrange(n_users - 1)))
+        check_login(BENCH_PASSWORD, rec["Password"] if rec else None)
+
+    def add_intake(i):
+        store.add(user_email(rng.randrange(n_users - 1)), today.isoformat(), "bench", 100)
+
+    def get_today_intake(i):
+        store.for_day(user_email(rng.randrange(n_users - 1)), today.isoformat())
+
+    def touch_user_streak(i):
+        streaks.touch(user_email(rng.randrange(n_users - 1)), today)
+
+    results["save_user"] = measure(save_user, min(args.ops, HASH_OPS))
+    results["authenticate"] = measure(authenticate, min(args.ops, HASH_OPS))
+    results["add_intake"] = measure(add_intake, args.ops)
+    results["get_today_intake"] = measure(get_today_intake, args.ops)
+    results["touch_user_streak"] = measure(touch_user_streak, args.ops)
+    for days in (7, 30, 90):
+        results[f"progress_{days}d"] = measure(lambda i: user_progress(store, HEAVY_USER, days, today), args.ops // 5 or 1)
+    since = (today - datetime.timedelta(days=179)).isoformat()
+    results["history_180d"] = measure(
+        lambda i: store.history(user_email(rng.randrange(n_users - 1)), since, today.isoformat()), args.ops // 5 or 1
+    )
+    results["targets_all_users"] = measure(lambda i: user_targets(repo.frame()), 3)
+
+    if not args.data:
+        shutil.rmtree(d, ignore_errors=True)
+    print(json.dumps({"bench": "data_paths", "backend": args.backend, "users": n_users, "rows": args.rows, "dataset": dataset, "results": results}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# Synthetic data for the benchmarks: a users.csv, plus intake rows spread over
+# the last `days` days and streak history in the chosen storage backend. Every user shares
+# one real scrypt hash of BENCH_PASSWORD, because hashing a million distinct
+# passwords would take hours. HEAVY_USER logs three items on every day, so
+# their progress charts and streaks always have data.
+#
+#   python bench/datasets.py DIR [--users 10000] [--rows 1000000] [--days 90] [--backend sqlite]
+import argparse
+import csv
+import datetime
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nutrition import GENDERS, GOALS, PROFILE_ACTIVITIES  # noqa: E402
+from security import hash_password  # noqa: E402
+from storage import BACKENDS, open_storage  # noqa: E402
+
+USER_COLS = ["Name", "Email", "Password", "Height", "Weight", "Gender", "Activity", "Goal", "SignupDate", "ProfileS3Key"]
+HEAVY_USER = "heavy@bench.example"
+BENCH_PASSWORD = "bench-pass"
+ITEMS = ["oatmeal", "banana", "chicken breast", "rice", "salad", "yogurt", "apple", "pasta", "eggs", "coffee"]
+CHUNK = 50_000
+STREAK_USERS = 1000
+
+
+def user_email(i):
+    return f"user{i}@bench.example"
+
+
+def write_users(path, users, stored_hash, rng):
+    # the values signup stores, so every user takes the real target paths
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(USER_COLS)
+        writer.writerow(["Heavy", HEAVY_USER, stored_hash, 175, 70, "Female", "Moderate", "Maintenance", "2024-01-01", ""])
+        for i in range(users - 1):
+            writer.writerow([
+                f"User {i}", user_email(i), stored_hash, rng.randint(150, 200), rng.randint(45, 120),
+                rng.choice(GENDERS), rng.choice(PROFILE_ACTIVITIES), rng.choice(GOALS), "2024-01-01", "",
+            ])
+
+
+def intake_rows(users, rows, days, today, rng):
+    for _ in range(rows):
+        day = today - datetime.timedelta(days=rng.randrange(days))
+        yield user_email(rng.randrange(max(users - 1, 1))), day.isoformat(), rng.choice(ITEMS), rng.randint(50, 900)
+
+
+def open_dataset(d, backend="sqlite"):
+    return open_storage(backend, USER_COLS, db_path=os.path.join(d, "nutra.db"), users_csv=os.path.join(d, "users.csv"),
+                        intake_csv=os.path.join(d, "intake.csv"), water_csv=os.path.join(d, "water.csv"),
+                        streaks_json=os.path.join(d, "streaks.json"), profiles_dir=os.path.join(d, "profiles"),
+                        archive_dir=os.path.join(d, "archive"))
+
+
+def make_dataset(d, users=10_000, rows=1_000_000, days=90, seed=1, backend="sqlite"):
+    rng = random.Random(seed)
+    today = datetime.date.today()
+    os.makedirs(d, exist_ok=True)
+    start = time.perf_counter()
+    write_users(os.path.join(d, "users.csv"), users, hash_password(BENCH_PASSWORD), rng)
+
+    storage = open_dataset(d, backend)  # the sqlite backend imports users.csv here
+    store = storage.intake
+    pending = []
+    for row in intake_rows(users, rows, days, today, rng):
+        pending.append(row)
+        if len(pending) >= CHUNK:
+            store.add_many(pending)
+            pending = []
+    heavy = [(HEAVY_USER, (today - datetime.timedelta(days=n)).isoformat(), rng.choice(ITEMS), rng.randint(200, 900))
+             for n in range(days) for _ in range(3)]
+    store.add_many(pending + heavy)
+
+    streaks = storage.streaks
+    for n in range(days - 1, -1, -1):
+        streaks.touch(HEAVY_USER, today - datetime.timedelta(days=n))
+    for i in range(min(users - 1, STREAK_USERS)):
+        for n in range(6, -1, -1):
+            if rng.random() < 0.7:
+                streaks.touch(user_email(i), today - datetime.timedelta(days=n))
+    return {"backend": backend, "users": users, "rows": rows + len(heavy), "days": days,
+            "seconds": round(time.perf_counter() - start, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("dir")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--backend", choices=BACKENDS, default="sqlite")
+    args = parser.parse_args()
+    info = make_dataset(args.dir, args.users, args.rows, args.days, args.seed, args.backend)
+    print(json.dumps({"bench": "dataset", "dir": args.dir, **info}))
+
+
+if __name__ == "__main__":
+    main()
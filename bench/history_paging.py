@@ -0,0 +1,86 @@
+# History paging across the hot table and the Parquet archive: one user's
+# entries are logged, every month before the last few is compacted, and more
+# entries are logged, many of them dated in already archived months (as an
+# import or a backdated entry would be). Every page size then walks every
+# page, and the pages must concatenate to the user's entries in date order,
+# each exactly once. Exits non-zero otherwise. Needs pyarrow.
+#
+#   python bench/history_paging.py [--rows 1200] [--days 400]
+import argparse
+import datetime
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import Compactor, IntakeArchive, IntakeStore  # noqa: E402
+
+
+def walk(store, email, start, end, size):
+    rows, offset = [], 0
+    while True:
+        page, total = store.history_page(email, start, end, offset, size)
+        if not page:
+            return rows, total
+        rows += page
+        offset += size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1200)
+    parser.add_argument("--days", type=int, default=400)
+    args = parser.parse_args()
+    if not IntakeArchive.available():
+        print(json.dumps({"bench": "history_paging", "skipped": "pyarrow is not installed", "ok": True}))
+        return
+
+    d = tempfile.mkdtemp(prefix="nutra-history-")
+    store = IntakeStore(os.path.join(d, "nutra.db"), IntakeArchive(os.path.join(d, "archive")))
+    rng = random.Random(7)
+    email = "history@example.com"
+    today = datetime.date.today()
+    rows = [(email, (today - datetime.timedelta(days=rng.randrange(args.days))).isoformat(), f"item {i}", i)
+            for i in range(args.rows)]
+    half = len(rows) // 2
+    store.add_many(rows[:half])
+    Compactor(store).run_once()
+    store.add_many(rows[half:])
+
+    checks = []
+    start = time.perf_counter()
+    first = min(r[1] for r in rows)
+    half_way = (today - datetime.timedelta(days=args.days // 2)).isoformat()
+    for lo, hi in [(first, today.isoformat()), (half_way, today.isoformat())]:
+        expected = sorted((r for r in rows if lo <= r[1] <= hi), key=lambda r: r[1], reverse=True)
+        for size in (7, 25, 100):
+            got, total = walk(store, email, lo, hi, size)
+            checks.append({
+                "range": [lo, hi],
+                "page_size": size,
+                "total_ok": total == len(expected),
+                "order_ok": [r["Date"] for r in got] == [r[1] for r in expected],
+                "each_once": sorted(r["Item"] for r in got) == sorted(r[2] for r in expected),
+            })
+    elapsed = time.perf_counter() - start
+
+    ok = all(c["total_ok"] and c["order_ok"] and c["each_once"] for c in checks)
+    print(json.dumps({
+        "bench": "history_paging",
+        "rows": args.rows,
+        "archived_months": len(store.archive.months()),
+        "failed": [c for c in checks if not (c["total_ok"] and c["order_ok"] and c["each_once"])],
+        "seconds": round(elapsed, 2),
+        "ok": ok,
+    }))
+    shutil.rmtree(d, ignore_errors=True)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
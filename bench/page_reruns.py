@@ -0,0 +1,74 @@
+# Rerun latency of every page, rendered headlessly through AppTest on a
+# synthetic dataset (see datasets.py), logged in as the dataset's heavy user.
+# Each page is opened from the sidebar once, then rerun `--runs` times as if
+# the user kept clicking on it.
+#
+#   python bench/page_reruns.py [--users 10000] [--rows 200000] [--runs 20]
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import time
+
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.testing.v1 import AppTest, local_script_runner
+
+from datasets import HEAVY_USER, make_dataset
+from welcome_latency import scratch_copy
+
+PAGES = ["About", "Profile", "Water", "Nutrition", "Progress", "History", "Streaks", "Data"]
+
+# share one bytecode cache across runs, as the server does (see startup_rerun.py)
+_script_cache = ScriptCache()
+local_script_runner.ScriptCache = lambda: _script_cache
+
+
+def navigate(at, page):
+    next(s for s in at.sidebar.selectbox if s.label == "Navigate").select(page)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    d = scratch_copy()
+    dataset = make_dataset(d, args.users, args.rows)
+    os.chdir(d)
+    at = AppTest.from_file(os.path.join(d, "main.py"), default_timeout=120)
+    at.session_state["logged_in"] = True
+    at.session_state["current_user"] = HEAVY_USER
+    at.run()
+
+    results = {}
+    for page in PAGES:
+        navigate(at, page)
+        start = time.perf_counter()
+        at.run()
+        first_ms = (time.perf_counter() - start) * 1000
+        if at.exception:
+            results[page] = {"error": at.exception[0].message}
+            continue
+        timings = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            at.run()
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        results[page] = {
+            "first_ms": round(first_ms, 1),
+            "p50_ms": round(statistics.median(timings), 1),
+            "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 1),
+        }
+
+    shutil.rmtree(d, ignore_errors=True)
+    print(json.dumps({"bench": "page_reruns", "runs": args.runs, "dataset": dataset, "results": results}))
+    return 1 if any("error" in r for r in results.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
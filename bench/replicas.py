@@ -0,0 +1,151 @@
+# Throughput of 1, 2, 4 ... app replicas sharing one dataset (see datasets.py),
+# each a separate process with its own stores, as separate Streamlit servers
+# behind a load balancer would be. With --backend remote (the default) the
+# replicas talk to one store server process over TCP, as replicas on
+# different hosts would; with sqlite they open the database file directly,
+# which only works on one host. Every replica runs `--sessions` threads doing
+# what a rerun does against storage: the user-context version check, today's
+# intake, and every `--write-every` reruns an intake entry. Also checks that
+# a profile update made by one replica changes the data version another
+# replica sees (which is what invalidates its cached user context).
+#
+# n replicas must reach at least `--min-efficiency` x n the reruns/s of one.
+# Replica counts the machine cannot run in parallel (n cores, plus one for
+# the store server) are skipped, and a skipped count fails the bench: on such
+# a machine scaling has not been shown.
+#
+#   python bench/replicas.py [--users 10000] [--rows 200000] [--max-replicas 4] [--sessions 4]
+#                            [--seconds 5] [--write-every 5] [--min-efficiency 0.7] [--backend remote]
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datasets import USER_COLS, make_dataset, open_dataset, user_email  # noqa: E402
+from storage import SqliteRateLimiter, StoreServer, open_storage  # noqa: E402
+
+STORE_KEY = b"replicas-bench"
+
+
+def cores():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not on Linux
+        return os.cpu_count() or 1
+
+
+def serve(d, ready):
+    # the store server: the only process that opens the database
+    storage = open_dataset(d)
+    server = StoreServer(storage, ("127.0.0.1", 0), STORE_KEY,
+                         SqliteRateLimiter(os.path.join(d, "nutra.db"), capacity=5, rate=5 / 60))
+    ready.put(server.address)
+    server.serve_forever()
+
+
+def open_replica(d, address):
+    if address is None:
+        return open_dataset(d)
+    return open_storage("remote", USER_COLS, remote_address=address, remote_key=STORE_KEY)
+
+
+def replica(d, address, seed, users, sessions, seconds, write_every):
+    storage = open_replica(d, address)
+    today = datetime.date.today().isoformat()
+    counts = [0] * sessions
+    deadline = time.perf_counter() + seconds
+
+    def session(t):
+        rng = random.Random(seed * 1000 + t)
+        email = user_email(rng.randrange(users - 1))
+        while time.perf_counter() < deadline:
+            storage.intake.data_version(email)
+            storage.intake.for_day(email, today)
+            counts[t] += 1
+            if counts[t] % write_every == 0:
+                storage.intake.add(email, today, "bench", 100)
+
+    pool = [threading.Thread(target=session, args=(t,)) for t in range(sessions)]
+    for th in pool:
+        th.start()
+    for th in pool:
+        th.join()
+    return sum(counts)
+
+
+def cross_replica_version(d, address):
+    # one replica updates a profile, the other sees the version move
+    with multiprocessing.Pool(1) as pool:
+        email = user_email(0)
+        before = open_replica(d, address).intake.data_version(email)
+        pool.apply(_update_profile, (d, address, email))
+        return open_replica(d, address).intake.data_version(email) != before
+
+
+def _update_profile(d, address, email):
+    open_replica(d, address).users.update(email, {"Weight": 70})
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--max-replicas", type=int, default=4)
+    parser.add_argument("--sessions", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--write-every", type=int, default=5)
+    parser.add_argument("--min-efficiency", type=float, default=0.7)
+    parser.add_argument("--backend", choices=["remote", "sqlite"], default="remote")
+    args = parser.parse_args()
+
+    d = tempfile.mkdtemp(prefix="nutra-replicas-")
+    dataset = make_dataset(d, args.users, args.rows)
+    server = address = None
+    if args.backend == "remote":
+        ready = multiprocessing.Queue()
+        server = multiprocessing.Process(target=serve, args=(d, ready), daemon=True)
+        server.start()
+        address = ready.get(timeout=60)
+    n_cores = cores()
+    results = {}
+    n = 1
+    while n <= args.max_replicas:
+        needed = n + (server is not None)
+        if n > 1 and n_cores < needed:
+            results[n] = {"skipped": f"needs {needed} cores, {n_cores} available"}
+        else:
+            jobs = [(d, address, p, args.users, args.sessions, args.seconds, args.write_every) for p in range(n)]
+            with multiprocessing.Pool(n) as pool:
+                reruns = sum(pool.starmap(replica, jobs))
+            results[n] = {"reruns_per_s": round(reruns / args.seconds, 1)}
+        n *= 2
+    base = results[1]["reruns_per_s"] or 1
+    for n, r in results.items():
+        if "reruns_per_s" in r:
+            r["speedup"] = round(r["reruns_per_s"] / base, 2)
+            r["expected_speedup"] = round(args.min_efficiency * n, 2)
+    measured = [r for r in results.values() if "speedup" in r]
+    skipped = [n for n, r in results.items() if "skipped" in r]
+    scales = None if skipped else all(r["speedup"] >= r["expected_speedup"] for r in measured)
+    invalidation = cross_replica_version(d, address)
+    if server is not None:
+        server.terminate()
+    shutil.rmtree(d, ignore_errors=True)
+    ok = bool(scales) and invalidation
+    print(json.dumps({"bench": "replicas", "backend": args.backend, "cores": n_cores, "sessions": args.sessions,
+                      "dataset": dataset, "results": results, "skipped": skipped, "scales": scales,
+                      "cross_replica_invalidation": invalidation, "ok": ok}))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+# Cost of the first script run in a fresh process (startup) versus every later
+# rerun of the same session, which is what each click pays. Wall time comes
+# from plain runs; allocations from a second pass under tracemalloc (peak
+# bytes allocated during one run). Runs inside a scratch copy through AppTest.
+#
+#   python bench/startup_rerun.py [--runs 20] [--src DIR]
+#
+# --src points at another checkout (e.g. a `git worktree` of an older commit)
+# to compare before/after on the same machine.
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import time
+import tracemalloc
+
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.testing.v1 import AppTest, local_script_runner
+
+from welcome_latency import ROOT, check, scratch_copy
+
+# AppTest compiles main.py again on every run, which would swamp the numbers;
+# the server keeps one bytecode cache per process, so share one here as well
+_script_cache = ScriptCache()
+local_script_runner.ScriptCache = lambda: _script_cache
+
+
+def timed_run(at):
+    start = time.perf_counter()
+    at.run()
+    elapsed = (time.perf_counter() - start) * 1000
+    check(at, "startup_rerun")
+    return elapsed
+
+
+def alloc_run(at):
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    at.run()
+    peak = (tracemalloc.get_traced_memory()[1] - before) / 1024
+    check(at, "startup_rerun")
+    return peak
+
+
+def login(at):
+    at.session_state["logged_in"] = True
+    at.session_state["current_user"] = "bench@example.com"
+
+
+def summary(values, unit):
+    return {f"p50_{unit}": round(statistics.median(values), 1), f"max_{unit}": round(max(values), 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--src", default=ROOT)
+    args = parser.parse_args()
+
+    d = scratch_copy(os.path.abspath(args.src))
+    os.chdir(d)
+    script = os.path.join(d, "main.py")
+
+    at = AppTest.from_file(script, default_timeout=60)
+    startup_ms = timed_run(at)  # first run in this process: all one-time work
+    entry_ms = [timed_run(at) for _ in range(args.runs)]
+    login(at)
+    at.run()
+    page_ms = [timed_run(at) for _ in range(args.runs)]
+
+    tracemalloc.start()
+    at = AppTest.from_file(script, default_timeout=60)
+    at.run()
+    entry_kb = [alloc_run(at) for _ in range(args.runs)]
+    login(at)
+    at.run()
+    page_kb = [alloc_run(at) for _ in range(args.runs)]
+    tracemalloc.stop()
+
+    shutil.rmtree(d, ignore_errors=True)
+    print(json.dumps({
+        "bench": "startup_rerun",
+        "runs": args.runs,
+        "startup_ms": round(startup_ms, 1),
+        "rerun_logged_out": {**summary(entry_ms, "ms"), **summary(entry_kb, "alloc_kb")},
+        "rerun_logged_in": {**summary(page_ms, "ms"), **summary(page_kb, "alloc_kb")},
+        "ok": True,
+    }))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
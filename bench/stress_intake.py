@@ -0,0 +1,120 @@
+# Concurrency stress check for the data files: N threads (optionally in P
+# processes) log intake into one nutra.db (or, with --backend csv, one
+# intake.csv) and register users into one users.csv at the same time, then
+# every row is counted. Exits non-zero if a single write was lost.
+#
+#   python bench/stress_intake.py [--threads 16] [--rows 200] [--processes 2] [--batch 0] [--backend sqlite]
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import CsvIntakeStore, IntakeStore, UserRepository  # noqa: E402
+
+USER_COLS = ["Name", "Email", "Password", "Height", "Weight", "Gender", "Activity", "Goal", "SignupDate", "ProfileS3Key"]
+
+
+def open_intake(d, backend):
+    if backend == "csv":
+        return CsvIntakeStore(os.path.join(d, "intake.csv"), os.path.join(d, "water.csv"))
+    return IntakeStore(os.path.join(d, "nutra.db"))
+
+
+def count_intake(d, backend):
+    # (rows, calories summed): from daily_totals for sqlite, the file for csv
+    if backend == "csv":
+        with open(os.path.join(d, "intake.csv"), newline="") as f:
+            rows = list(csv.DictReader(f))
+        return len(rows), sum(float(r["Calories"]) for r in rows)
+    conn = sqlite3.connect(os.path.join(d, "nutra.db"))
+    rows = conn.execute("SELECT COUNT(*) FROM intake").fetchone()[0]
+    total = conn.execute("SELECT SUM(Calories) FROM daily_totals").fetchone()[0]
+    conn.close()
+    return rows, total
+
+
+def worker(d, proc, threads, rows, batch, backend):
+    # each process builds its own store/repository, like separate app servers
+    store = open_intake(d, backend)
+    repo = UserRepository(os.path.join(d, "users.csv"), USER_COLS)
+    errors = []
+
+    def run(t):
+        try:
+            email = f"user{proc}-{t}@example.com"
+            repo.add({"Name": f"u{proc}-{t}", "Email": email, "Password": "x"})
+            pending = []
+            for i in range(rows):
+                row = (email, "2024-01-01", f"item {i}", 1)
+                if batch:
+                    pending.append(row)
+                    if len(pending) >= batch:
+                        store.add_many(pending)
+                        pending = []
+                else:
+                    store.add(*row)
+                if i % 50 == 0:
+                    # interleave read-modify-write updates with the appends
+                    repo.update(email, {"Weight": i})
+            if pending:
+                store.add_many(pending)
+        except Exception as e:  # reported by the parent
+            errors.append(repr(e))
+
+    pool = [threading.Thread(target=run, args=(t,)) for t in range(threads)]
+    for th in pool:
+        th.start()
+    for th in pool:
+        th.join()
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--processes", type=int, default=2)
+    parser.add_argument("--batch", type=int, default=0, help="group-commit size (0 = one transaction per row)")
+    parser.add_argument("--backend", choices=["sqlite", "csv"], default="sqlite")
+    args = parser.parse_args()
+
+    d = tempfile.mkdtemp(prefix="nutra-stress-")
+    open_intake(d, args.backend)  # create the schema once up front
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.processes) as pool:
+        results = pool.starmap(worker, [(d, p, args.threads, args.rows, args.batch, args.backend)
+                                        for p in range(args.processes)])
+    elapsed = time.perf_counter() - start
+
+    writers = args.processes * args.threads
+    rows, total = count_intake(d, args.backend)
+    users = UserRepository(os.path.join(d, "users.csv"), USER_COLS).frame()
+    errors = [e for r in results for e in r]
+    ok = not errors and rows == total == writers * args.rows and len(users) == writers
+    print(json.dumps({
+        "bench": "stress_intake",
+        "backend": args.backend,
+        "writers": writers,
+        "expected_rows": writers * args.rows,
+        "intake_rows": rows,
+        "daily_total": total,
+        "users": len(users),
+        "errors": errors[:5],
+        "seconds": round(elapsed, 2),
+        "ok": ok,
+    }))
+    shutil.rmtree(d, ignore_errors=True)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# Runs every benchmark in its own process and emits a single JSON document
+# tagged with the commit, so results can be appended to a file and compared
+# across changes.
+#
+#   python bench/suite.py [--size small|medium|large] [--out results.jsonl]
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# users / intake rows for the data paths and the page reruns
+SIZES = {
+    "small": {"users": 10_000, "rows": 200_000, "page_rows": 100_000},
+    "medium": {"users": 100_000, "rows": 2_000_000, "page_rows": 500_000},
+    "large": {"users": 1_000_000, "rows": 5_000_000, "page_rows": 1_000_000},
+}
+
+
+def benches(size):
+    s = SIZES[size]
+    return [
+        ["startup_rerun.py"],
+        ["welcome_latency.py"],
+        ["data_paths.py", "--users", str(s["users"]), "--rows", str(s["rows"])],
+        ["page_reruns.py", "--users", str(s["users"]), "--rows", str(s["page_rows"])],
+        ["stress_intake.py", "--threads", "8", "--rows", "100"],
+        ["stress_intake.py", "--threads", "8", "--rows", "100", "--backend", "csv"],
+        ["bad_uploads.py"],
+        ["history_paging.py"],
+        ["write_behind.py"],
+        ["bulk_transfer.py", "--rows", str(s["rows"])],
+        ["replicas.py", "--users", str(s["users"]), "--rows", str(s["page_rows"])],
+    ]
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def run(argv):
+    proc = subprocess.run([sys.executable, os.path.join(HERE, argv[0])] + argv[1:], capture_output=True, text=True)
+    # every bench prints exactly one JSON object as its last stdout line
+    lines = proc.stdout.strip().splitlines()
+    try:
+        result = json.loads(lines[-1])
+    except (IndexError, json.JSONDecodeError):
+        result = {"bench": argv[0], "error": proc.stderr.strip().splitlines()[-1:] or ["no output"]}
+    result["exit_code"] = proc.returncode
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", choices=sorted(SIZES), default="small")
+    parser.add_argument("--out", help="append the document to this JSON-lines file")
+    args = parser.parse_args()
+
+    doc = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "size": args.size,
+        "results": [run(argv) for argv in benches(args.size)],
+    }
+    line = json.dumps(doc)
+    print(line)
+    if args.out:
+        with open(args.out, "a") as f:
+            f.write(line + "\n")
+    return 0 if all(r["exit_code"] == 0 for r in doc["results"]) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
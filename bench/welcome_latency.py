@@ -0,0 +1,65 @@
+# Time-to-first-render of the first page after login/signup, i.e. a full
+# script run with the welcome flash pending. Runs the app headlessly through
+# Streamlit's AppTest inside a scratch copy so no data files are touched.
+#
+#   python bench/welcome_latency.py [runs]
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from streamlit.testing.v1 import AppTest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def scratch_copy(root=ROOT):
+    # the app's modules, packages (storage/) and data files, nothing else
+    d = tempfile.mkdtemp(prefix="nutra-bench-")
+    for name in os.listdir(root):
+        src = os.path.join(root, name)
+        if os.path.isfile(src) and name.endswith((".py", ".png", ".jpg", ".csv")):
+            shutil.copy(src, d)
+        elif os.path.isfile(os.path.join(src, "__init__.py")) or name == ".streamlit":
+            shutil.copytree(src, os.path.join(d, name), ignore=shutil.ignore_patterns("__pycache__"))
+    return d
+
+
+def check(at, bench):
+    # a run that ended on an exception page is not a timing: fail the bench
+    if at.exception:
+        print(json.dumps({"bench": bench, "error": [e.message for e in at.exception], "ok": False}))
+        sys.exit(1)
+
+
+def main(runs=5):
+    d = scratch_copy()
+    os.chdir(d)
+    at = AppTest.from_file(os.path.join(d, "main.py"), default_timeout=60)
+    at.run()  # warm-up: process-wide caches and file creation
+    check(at, "welcome_first_render")
+    timings = []
+    for _ in range(runs):
+        at.session_state["logged_in"] = True
+        at.session_state["current_user"] = "bench@example.com"
+        at.session_state["welcome_name"] = "Bench"
+        at.session_state["show_welcome"] = True
+        start = time.perf_counter()
+        at.run()
+        timings.append((time.perf_counter() - start) * 1000)
+        check(at, "welcome_first_render")
+    shutil.rmtree(d, ignore_errors=True)
+    print(json.dumps({
+        "bench": "welcome_first_render",
+        "runs": runs,
+        "p50_ms": round(statistics.median(timings), 1),
+        "max_ms": round(max(timings), 1),
+        "ok": True,
+    }))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,219 @@
+# Write-behind queue (storage/writebehind.py) under a stalled or failing
+# store, against a sqlite dataset:
+#   stalled   the intake commit and an image put hang; page reads (for_day,
+#             user, streak) for the writing user and for another user must
+#             still return within --deadline seconds, with every row once
+#   image     an image put fails; the profile update pointing at it must be
+#             dropped (ProfileS3Key unchanged) and both reported to on_error
+#   counts    writers and readers run at once; a reader must never see a
+#             day's row count go down or above what was written
+#   versions  data_version() reads the store at most once per TTL, and
+#             still changes as soon as this process writes
+# Exits non-zero if any check fails.
+#
+#   python bench/write_behind.py [--deadline 1.0] [--writers 4] [--rows 200]
+import argparse
+import datetime
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datasets import USER_COLS  # noqa: E402
+from storage import WriteBehind, open_storage  # noqa: E402
+
+
+class Gate:
+    # wraps a store so the named methods block until the gate opens (or fail)
+    def __init__(self, store, methods, fail=None):
+        self.store = store
+        self.methods = methods
+        self.fail = fail
+        self.entered = threading.Event()
+        self.opened = threading.Event()
+
+    def __getattr__(self, name):
+        attr = getattr(self.store, name)
+        if name not in self.methods:
+            return attr
+
+        def gated(*args, **kwargs):
+            if self.fail and self.fail(*args):
+                raise OSError(f"{name} failed")
+            self.entered.set()
+            self.opened.wait()
+            return attr(*args, **kwargs)
+        return gated
+
+
+def make_storage(d):
+    storage = open_storage("sqlite", USER_COLS, db_path=os.path.join(d, "nutra.db"),
+                           users_csv=os.path.join(d, "users.csv"), profiles_dir=os.path.join(d, "profiles"))
+    for name in ("a", "b"):
+        storage.users.add({"Name": name, "Email": f"{name}@example.com", "Password": "x"})
+    return storage
+
+
+def timed_reads(writer, today, deadline):
+    # what a page render reads, for the writing user and for another one
+    start = time.perf_counter()
+    out = {}
+    done = threading.Event()
+
+    def render():
+        out["a_rows"] = len(writer.for_day("a@example.com", today))
+        out["b_rows"] = len(writer.for_day("b@example.com", today))
+        out["a_weight"] = writer.user("a@example.com")["Weight"]
+        out["a_streak"] = writer.streak("a@example.com")["Current"]
+        done.set()
+
+    threading.Thread(target=render, daemon=True).start()
+    out["finished"] = done.wait(deadline)
+    out["ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return out
+
+
+def check_stalled(d, deadline):
+    storage = make_storage(d)
+    today = datetime.date.today()
+    storage.intake.add("b@example.com", today.isoformat(), "stored", 100)
+    intake = Gate(storage.intake, {"add_many"})
+    images = Gate(storage.images, {"put"})
+    writer = WriteBehind(storage._replace(intake=intake, images=images)).start()
+    writer.put_image("stalled.png", b"x")
+    writer.add_intake("a@example.com", today.isoformat(), "pending", 200)
+    writer.add_intake("b@example.com", today.isoformat(), "pending", 200)
+    writer.update_user("a@example.com", {"Weight": 71})
+    writer.touch("a@example.com", today)
+    images.entered.wait(5)
+    reads = {"image_put_stalled": timed_reads(writer, today.isoformat(), deadline)}
+    images.opened.set()
+    intake.entered.wait(5)
+    reads["intake_commit_stalled"] = timed_reads(writer, today.isoformat(), deadline)
+    intake.opened.set()
+    writer.flush(timeout=30)
+    reads["committed"] = timed_reads(writer, today.isoformat(), deadline)
+    writer.close()
+    expected = {"finished": True, "a_rows": 1, "b_rows": 2, "a_weight": "71", "a_streak": 1}
+    ok = all({k: r[k] for k in expected} == expected for r in reads.values())
+    return ok, reads
+
+
+def check_image_failure(d):
+    storage = make_storage(d)
+    storage.users.update("a@example.com", {"ProfileS3Key": "sha256/old.png"})
+    errors = []
+    images = Gate(storage.images, {"put"}, fail=lambda key, data: key.startswith("sha256/new"))
+    images.opened.set()
+    writer = WriteBehind(storage._replace(images=images), on_error=lambda kind, e: errors.append(kind)).start()
+    writer.put_image("sha256/new_72.webp", b"thumb")
+    writer.put_image("sha256/new.png", b"original")
+    writer.update_user("a@example.com", {"ProfileS3Key": "sha256/new.png"})
+    writer.update_user("b@example.com", {"Weight": 80})
+    writer.flush(timeout=30)
+    writer.close()
+    key = storage.users.get("a@example.com")["ProfileS3Key"]
+    other = storage.users.get("b@example.com")["Weight"]
+    ok = key == "sha256/old.png" and other == "80" and "image" in errors and "user" in errors
+    return ok, {"profile_key": key, "other_update": other, "errors": errors}
+
+
+def check_counts(d, writers, rows):
+    storage = make_storage(d)
+    today = datetime.date.today().isoformat()
+    writer = WriteBehind(storage, max_batch=50).start()
+    stop = threading.Event()
+    bad = []
+
+    def write(t):
+        for i in range(rows):
+            writer.add_intake("a@example.com", today, f"w{t}-{i}", 1)
+
+    def read():
+        last = 0
+        while not stop.is_set():
+            n = len(writer.for_day("a@example.com", today))
+            if n < last or n > writers * rows:
+                bad.append((last, n))
+            last = n
+
+    readers = [threading.Thread(target=read) for _ in range(2)]
+    pool = [threading.Thread(target=write, args=(t,)) for t in range(writers)]
+    for th in readers + pool:
+        th.start()
+    for th in pool:
+        th.join()
+    writer.flush(timeout=60)
+    stop.set()
+    for th in readers:
+        th.join()
+    final = len(writer.for_day("a@example.com", today))
+    writer.close()
+    ok = not bad and final == writers * rows
+    return ok, {"rows": final, "expected": writers * rows, "bad_reads": bad[:5]}
+
+
+class Counting:
+    def __init__(self, store):
+        self.store = store
+        self.calls = 0
+
+    def data_version(self, email):
+        self.calls += 1
+        return self.store.data_version(email)
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+
+def check_versions(d):
+    storage = make_storage(d)
+    intake = Counting(storage.intake)
+    writer = WriteBehind(storage._replace(intake=intake), version_ttl=0.5).start()
+    email = "a@example.com"
+    first = writer.data_version(email)
+    reruns = [writer.data_version(email) for _ in range(100)]
+    steady = intake.calls == 1 and all(v == first for v in reruns)
+    writer.add_intake(email, datetime.date.today().isoformat(), "apple", 52)
+    queued = writer.data_version(email)
+    writer.flush(timeout=30)
+    committed = writer.data_version(email)
+    storage.intake.add(email, datetime.date.today().isoformat(), "elsewhere", 1)  # another process
+    unseen = writer.data_version(email)
+    time.sleep(0.6)
+    seen = writer.data_version(email)
+    writer.close()
+    ok = steady and len({first, queued, committed}) == 3 and unseen == committed and seen != committed
+    return ok, {"store_reads_for_101_calls": 1 if steady else intake.calls, "changes_on_write": queued != first,
+                "changes_on_commit": committed != queued, "other_process_seen_after_ttl": seen != committed}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--deadline", type=float, default=1.0)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=200)
+    args = parser.parse_args()
+
+    results = {}
+    ok = True
+    for name, check in [("stalled", lambda d: check_stalled(d, args.deadline)),
+                        ("image", check_image_failure),
+                        ("counts", lambda d: check_counts(d, args.writers, args.rows)),
+                        ("versions", check_versions)]:
+        d = tempfile.mkdtemp(prefix="nutra-writebehind-")
+        passed, results[name] = check(d)
+        results[name]["ok"] = passed
+        ok = ok and passed
+        shutil.rmtree(d, ignore_errors=True)
+    print(json.dumps({"bench": "write_behind", **results, "ok": ok}))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
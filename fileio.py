@@ -0,0 +1,62 @@
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: locking falls back to in-process only
+    fcntl = None
+
+
+class FileLock:
+    # Exclusive lock for one data file: an RLock orders the threads of this
+    # process (every Streamlit session is a thread), and flock() on a sidecar
+    # "<path>.lock" orders other processes. Re-entrant within a thread.
+    def __init__(self, path):
+        self.path = path + ".lock"
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._fh = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            self._fh = open(self.path, "a")
+            fcntl.flock(self._fh, fcntl.LOCK_EX)
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0 and self._fh is not None:
+            fcntl.flock(self._fh, fcntl.LOCK_UN)
+            self._fh.close()
+            self._fh = None
+        self._lock.release()
+
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def file_lock(path):
+    # one FileLock per absolute path, shared by every caller in the process
+    key = os.path.abspath(path)
+    with _locks_guard:
+        if key not in _locks:
+            _locks[key] = FileLock(key)
+        return _locks[key]
+
+
+def atomic_write(path, write, binary=False):
+    # write(f) fills a temp file next to `path`, which is fsynced and renamed
+    # over it: readers see either the old or the new file, never a torn one
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, "wb" if binary else "w", **({} if binary else {"newline": ""})) as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
@@ -0,0 +1,106 @@
+import bisect
+import csv
+import re
+from collections import Counter, defaultdict, namedtuple
+from difflib import SequenceMatcher
+
+GRAM_SERVINGS = (50, 100, 150, 200, 250)
+MIN_SIMILARITY = 0.6
+
+Food = namedtuple("Food", ["name", "kcal_100g", "unit", "unit_grams"])
+
+
+def servings(food):
+    # (label, grams) pairs: the food's natural unit first, then fixed weights
+    out = [(f"1 {food.unit}", food.unit_grams)] if food.unit else []
+    return out + [(f"{g}g", g) for g in GRAM_SERVINGS]
+
+
+def serving_kcal(food, grams):
+    return round(food.kcal_100g * grams / 100)
+
+
+def load_foods(path):
+    foods = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            foods.append(Food(
+                row["Food"].strip(),
+                float(row["KcalPer100g"]),
+                row.get("Unit", "").strip(),
+                float(row["UnitGrams"]) if row.get("UnitGrams") else 0.0,
+            ))
+    return foods
+
+
+def _normalize(text):
+    return " ".join(re.findall(r"[a-z0-9%]+", text.lower()))
+
+
+def _trigrams(text):
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class FoodIndex:
+    # Built once per process over the word vocabulary of all food names. A
+    # query word matches a vocabulary word by prefix (bisect on the sorted
+    # vocabulary) or, for typos, by similarity among the words sharing a
+    # trigram with it (inverted index), so a search only touches candidates.
+    def __init__(self, foods):
+        self.foods = list(foods)
+        self._names = [_normalize(f.name) for f in self.foods]
+        entries = defaultdict(list)
+        for i, n in enumerate(self._names):
+            for w in set(n.split()):
+                entries[w].append(i)
+        self._vocab = sorted(entries)
+        self._entries = [entries[w] for w in self._vocab]
+        self._postings = defaultdict(list)
+        for v, w in enumerate(self._vocab):
+            for g in _trigrams(w):
+                self._postings[g].append(v)
+
+    def __len__(self):
+        return len(self.foods)
+
+    def _word_matches(self, word):
+        # {vocab id: similarity in (0, 1]}
+        matches = {}
+        v = bisect.bisect_left(self._vocab, word)
+        while v < len(self._vocab) and self._vocab[v].startswith(word):
+            matches[v] = 1.0
+            v += 1
+        candidates = Counter(v for g in _trigrams(word) for v in self._postings.get(g, ()))
+        for v, shared in candidates.items():
+            if v in matches or shared < 2:
+                continue
+            ratio = SequenceMatcher(None, word, self._vocab[v]).ratio()
+            if ratio >= MIN_SIMILARITY:
+                matches[v] = ratio
+        return matches
+
+    def search(self, query, limit=10):
+        q = _normalize(query)
+        if not q:
+            return []
+        q_words = q.split()
+        scores = Counter()
+        for word in q_words:
+            best = {}
+            for v, sim in self._word_matches(word).items():
+                for i in self._entries[v]:
+                    if sim > best.get(i, 0.0):
+                        best[i] = sim
+            for i, sim in best.items():
+                scores[i] += sim / len(q_words)
+        for i in scores:
+            if self._names[i] == q:
+                scores[i] += 1.0
+            elif self._names[i].startswith(q):
+                scores[i] += 0.5
+        ranked = sorted(scores, key=lambda i: (-scores[i], len(self._names[i]), self._names[i]))
+        return [self.foods[i] for i in ranked[:limit]]
@@ -3,184 +3,371 @@ import pandas as pd
 import os
 import base64
 import datetime
-import random
-import matplotlib.pyplot as plt
-import json
-from io import BytesIO
+from matplotlib.figure import Figure
+import atexit
+import hmac
 import time
+from io import BytesIO
+from fileio import atomic_write, file_lock
+from storage import (
+    Compactor, RemoteStore, SqliteRateLimiter, WaterBuffer, WriteBehind, is_content_key, open_storage, parse_address,
+)
+from aggregates import user_progress
+from nutrition import CALCULATOR_ACTIVITIES, GENDERS, GOALS, PROFILE_ACTIVITIES, targets
+from transfer import export_intake, export_water, import_intake, import_water, spool
+from food_search import FoodIndex, load_foods, servings, serving_kcal
+from security import RateLimiter, check_login, hash_in_pool, needs_rehash
+from metrics import METRICS, ENABLED as METRICS_ENABLED, instrument_markdown, timed, to_json, to_prometheus
+from assets import STATIC_URL, BadImage, publish_asset, asset_url, make_thumbnail, put_profile_image, thumb_key
+
+RUN_START = time.perf_counter()
 
 # -------------------- Helpers --------------------
-def file_to_base64(path):
+def legacy_image_key(email):
+    # where pictures were kept before content addressing, overwritten in place
+    base = email.replace('@','__at__').replace('.','__dot__')
+    return f"{base}.png"
+
+@timed("storage.save_profile_image")
+def save_profile_image(email, uploaded_file):
+    if not uploaded_file:
+        return None
+    data = bytes(uploaded_file.getbuffer())
     try:
+        return put_profile_image(get_storage().images, get_writer(), data,
+                                 os.path.splitext(uploaded_file.name)[1].lower() or ".png")
+    except BadImage:
+        st.error("That file could not be read as an image. Please upload a PNG or JPEG picture.")
+        return None
+
+def migrate_profile_image(email):
+    # a picture from before content addressing moves to its content key on
+    # first view; the old file is left where it was. A damaged one is not
+    # migrated and the default avatar is shown instead.
+    original = get_storage().images.get(legacy_image_key(email))
+    if original is None:
+        return None
+    writer = get_writer()
+    try:
+        key = put_profile_image(get_storage().images, writer, original, ".png")
+    except BadImage:
+        return None
+    writer.update_user(email, {"ProfileS3Key": key})
+    return key
+
+@st.cache_resource(max_entries=512, show_spinner=False)
+def image_b64(key, etag):
+    # keyed by the etag: a content key is its own etag, so each picture is
+    # fetched once per process and a HEAD/stat is all a render costs
+    data = get_storage().images.get(key)
+    return base64.b64encode(data).decode() if data else None
+
+def read_profile_image_b64(email, key, size=140):
+    if not is_content_key(key):
+        key = migrate_profile_image(email)
+        if key is None:
+            return None
+    thumb = thumb_key(key, size)
+    pending = get_writer().image(thumb)
+    if pending is not None:
+        # just uploaded and not stored yet: shown once, not cached
+        return base64.b64encode(pending[0]).decode()
+    etag = get_storage().images.etag(thumb)
+    # missing (a put that failed): nothing to cache, the default avatar shows
+    return image_b64(thumb, etag) if etag else None
+
+@st.cache_resource
+def get_default_avatar_b64(size):
+    for path in ("person_clipart.png", "default_avatar.png"):
         if os.path.exists(path):
             with open(path, "rb") as f:
-                return base64.b64encode(f.read()).decode()
-    except Exception:
-        return None
+                return base64.b64encode(make_thumbnail(f.read(), size)).decode()
     return None
 
-def save_profile_image(email, uploaded_file):
-    if not uploaded_file:
-        return None
-    os.makedirs("profiles", exist_ok=True)
-    filename = f"profiles/{email.replace('@','__at__').replace('.','__dot__')}.png"
-    with open(filename, "wb") as f:
-        f.write(uploaded_file.getbuffer())
-    return filename
-
-def read_profile_image_b64(email):
-    filename = f"profiles/{email.replace('@','__at__').replace('.','__dot__')}.png"
-    return file_to_base64(filename) if os.path.exists(filename) else None
-
-def get_profile_b64(email):
-    b = read_profile_image_b64(email)
+def get_profile_b64(email, key, size=140):
+    b = read_profile_image_b64(email, key, size)
     if b:
         return b
-    clip = file_to_base64("person_clipart.png")
-    if clip:
-        return clip
-    return file_to_base64("default_avatar.png")
+    return get_default_avatar_b64(size)
 
 def pretty_date(dt):
     return dt.strftime("%Y-%m-%d %H:%M:%S")
 
 # -------------------- Assets --------------------
-LOGO2_B64 = file_to_base64("logo (2).png") or file_to_base64("logo.png")
-TITLE2_B64 = file_to_base64("title (2).png")
-LOGIN_BG_B64 = file_to_base64("login.jpg")
-GLOBAL_BG_B64 = file_to_base64("body.jpg") or file_to_base64("background2.jpg") or file_to_base64("background.jpg")
+# Images are published once per process into static/ (hashed, resized, WebP by
+# default) and referenced by URL, so reruns no longer ship them as base64.
+ASSET_WEBP = os.environ.get("NUTRA_ASSET_WEBP", "1") == "1"
+
+@st.cache_resource
+def get_asset_urls():
+    def first(*paths, max_width=None):
+        for p in paths:
+            name = publish_asset(p, max_width=max_width, webp=ASSET_WEBP)
+            if name:
+                return name
+        return None
+    names = {
+        "logo": first("logo (2).png", "logo.png", max_width=320),
+        "title": first("title (2).png", max_width=360),
+        "login_bg": first("login.jpg", max_width=1920),
+        "global_bg": first("body.jpg", "background2.jpg", "background.jpg", max_width=1920),
+        "about": first("image.jpg", max_width=1000),
+    }
+    names["favicon"] = first("logo (2).png", "logo.png", max_width=64)
+    serving = st.get_option("server.enableStaticServing")
+    return {k: asset_url(v, serving) for k, v in names.items()}
 
 # -------------------- Data files --------------------
 USERS_CSV = "users.csv"
 USER_COLS = ["Name", "Email", "Password", "Height", "Weight", "Gender", "Activity", "Goal", "SignupDate", "ProfileS3Key"]
 INTAKE_CSV = "intake.csv"
+WATER_CSV = "water.csv"
+DB_PATH = os.environ.get("NUTRA_DB_PATH", "nutra.db")
 STREAKS_JSON = "streaks.json"
+PROFILES_DIR = os.environ.get("NUTRA_PROFILES_DIR", "profiles")
+# with a bucket set, profile pictures go to S3 instead of PROFILES_DIR;
+# NUTRA_S3_ENDPOINT points at an S3-compatible server such as MinIO
+S3_BUCKET = os.environ.get("NUTRA_S3_BUCKET") or None
+S3_ENDPOINT = os.environ.get("NUTRA_S3_ENDPOINT") or None
+# "sqlite" (default), "csv" or "remote", see storage/__init__.py
+STORAGE_BACKEND = os.environ.get("NUTRA_STORAGE", "sqlite")
+# Several Streamlit processes on one host (behind a load balancer) can share
+# NUTRA_DB_PATH, NUTRA_PROFILES_DIR and NUTRA_ARCHIVE_DIR with the sqlite
+# backend. Keep them on a local disk: SQLite is not safe on NFS/SMB volumes.
+# Replicas on several hosts set NUTRA_STORAGE=remote and point at one store
+# server (python -m storage.remote) with NUTRA_STORE_ADDRESS (host:port) and
+# the shared secret NUTRA_STORE_KEY.
+STORE_ADDRESS = os.environ.get("NUTRA_STORE_ADDRESS", "127.0.0.1:7070")
+STORE_KEY = os.environ.get("NUTRA_STORE_KEY", "").encode()
+# intake older than the ARCHIVE_HOT_MONTHS most recent months is compacted
+# into Parquet under ARCHIVE_DIR every COMPACT_INTERVAL seconds (0 = never)
+ARCHIVE_DIR = os.environ.get("NUTRA_ARCHIVE_DIR", "archive")
+ARCHIVE_HOT_MONTHS = int(os.environ.get("NUTRA_ARCHIVE_HOT_MONTHS", 2))
+COMPACT_INTERVAL = float(os.environ.get("NUTRA_COMPACT_INTERVAL", 6 * 3600))
+
+@st.cache_resource
+def get_storage():
+    # one set of stores per process, shared by all sessions; the sqlite backend
+    # imports the CSV/JSON files the first time it opens them
+    return open_storage(STORAGE_BACKEND, USER_COLS, db_path=DB_PATH, users_csv=USERS_CSV, intake_csv=INTAKE_CSV,
+                        water_csv=WATER_CSV, streaks_json=STREAKS_JSON, profiles_dir=PROFILES_DIR,
+                        archive_dir=ARCHIVE_DIR, s3_bucket=S3_BUCKET, s3_endpoint=S3_ENDPOINT,
+                        remote_address=STORE_ADDRESS, remote_key=STORE_KEY)
+
+# page writes (intake, streak touches, profile updates and pictures) go
+# through one write-behind worker per process; WRITE_QUEUE bounds its queue
+WRITE_QUEUE = int(os.environ.get("NUTRA_WRITE_QUEUE", 10_000))
+# how stale a user's data version may get before the store is asked again,
+# i.e. how long a write from another process or replica can go unseen
+VERSION_TTL = float(os.environ.get("NUTRA_VERSION_TTL", 10))
+
+def on_write_commit(size, seconds, depth):
+    METRICS.observe("storage.write_behind_commit", seconds)
+    METRICS.incr("write_behind_ops", size)
+    METRICS.gauge("write_behind_queue_depth", depth)
+
+@st.cache_resource
+def get_writer():
+    writer = WriteBehind(get_storage(), max_queue=WRITE_QUEUE, on_commit=on_write_commit,
+                         on_error=lambda kind, e: METRICS.incr(f"write_behind_errors_{kind}"),
+                         version_ttl=VERSION_TTL).start()
+    # whatever is still queued is committed on shutdown
+    atexit.register(writer.close)
+    return writer
+
+def on_compaction_error(error):
+    METRICS.incr("compaction_errors")
+    METRICS.gauge("compaction_last_error_time", time.time())
+
+@st.cache_resource
+def get_compactor():
+    # one background compaction thread per process (sqlite backend only)
+    store = get_intake_store()
+    if getattr(store, "archive", None) is None or COMPACT_INTERVAL <= 0:
+        return None
+    return Compactor(store, ARCHIVE_HOT_MONTHS, COMPACT_INTERVAL,
+                     on_run=lambda moved: METRICS.incr("intake_rows_archived", moved),
+                     on_error=on_compaction_error).start()
 
 # -------------------- Local food DB --------------------
-FOOD_DB = {
-    "apple": {"cal": 52},
-    "banana": {"cal": 96},
-    "rice (100g)": {"cal": 130},
-    "chicken breast (100g)": {"cal": 165},
-    "egg (1 large)": {"cal": 78},
-}
+# 537 generic foods, kcal per 100 g plus a natural unit (e.g. "1 medium");
+# each is offered in that unit and in the GRAM_SERVINGS weights
+FOODS_CSV = "foods.csv"
+
+@st.cache_resource
+def get_food_index():
+    # loaded on first search and shared by every session in the process
+    return FoodIndex(load_foods(FOODS_CSV))
 
 # -------------------- Ensure files --------------------
 def ensure_files():
-    if not os.path.exists(USERS_CSV):
-        pd.DataFrame(columns=USER_COLS).to_csv(USERS_CSV, index=False)
-    else:
-        try:
-            df = pd.read_csv(USERS_CSV)
-            for col in USER_COLS:
-                if col not in df.columns:
-                    df[col] = ""
-            df.to_csv(USERS_CSV, index=False)
-        except Exception:
-            pd.DataFrame(columns=USER_COLS).to_csv(USERS_CSV, index=False)
-    if not os.path.exists(INTAKE_CSV):
-        pd.DataFrame(columns=["Email", "Date", "Item", "Calories"]).to_csv(INTAKE_CSV, index=False)
-    if not os.path.exists(STREAKS_JSON):
-        with open(STREAKS_JSON, "w") as f:
-            json.dump({}, f)
-
-ensure_files()
+    empty = pd.DataFrame(columns=USER_COLS)
+    with file_lock(USERS_CSV):
+        if not os.path.exists(USERS_CSV):
+            atomic_write(USERS_CSV, lambda f: empty.to_csv(f, index=False))
+        else:
+            try:
+                # only the header is needed to decide whether columns are missing
+                if set(USER_COLS) - set(pd.read_csv(USERS_CSV, nrows=0).columns):
+                    df = pd.read_csv(USERS_CSV)
+                    for col in USER_COLS:
+                        if col not in df.columns:
+                            df[col] = ""
+                    atomic_write(USERS_CSV, lambda f: df.to_csv(f, index=False))
+            except Exception:
+                atomic_write(USERS_CSV, lambda f: empty.to_csv(f, index=False))
 
 # -------------------- User utilities --------------------
+def get_user_repo():
+    return get_storage().users
+
+@timed("storage.load_users")
 def load_users():
-    return pd.read_csv(USERS_CSV)
+    return get_user_repo().frame()
 
+@timed("storage.save_user")
 def save_user(record):
-    df = load_users()
-    if record["Email"] in df["Email"].values:
+    repo = get_user_repo()
+    if repo.exists(record["Email"]):
         st.warning("Email already registered. Please log in.")
         return False
     record["SignupDate"] = pretty_date(datetime.datetime.now())
-    df = pd.concat([df, pd.DataFrame([record])], ignore_index=True)
-    df.to_csv(USERS_CSV, index=False)
+    record["Password"] = hash_in_pool(record["Password"])
+    if repo.add(record) is None:
+        # another session registered the same email in the meantime
+        st.warning("Email already registered. Please log in.")
+        return False
     st.success("Account created — thank you for registering with us!")
     return True
 
+@timed("storage.update_user")
 def update_user(email, updates: dict):
-    df = load_users()
-    idx = df.index[df["Email"] == email].tolist()
-    if not idx:
+    if not get_user_repo().exists(email):
         st.error("User not found.")
         return False
-    i = idx[0]
-    for k, v in updates.items():
-        if k in df.columns:
-            df.at[i, k] = v
-    df.to_csv(USERS_CSV, index=False)
+    get_writer().update_user(email, updates)
+    invalidate_user_context()
     st.success("Profile updated.")
     return True
 
+@st.cache_resource
+def get_login_limiter():
+    # 5 attempts per email and per client IP, then one more every 12 seconds;
+    # with sqlite the buckets live in the database, shared by every app process;
+    # remote replicas use the store server's
+    if STORAGE_BACKEND == "sqlite":
+        return SqliteRateLimiter(DB_PATH, capacity=5, rate=5 / 60)
+    if STORAGE_BACKEND == "remote":
+        return RemoteStore(parse_address(STORE_ADDRESS), STORE_KEY, "limiter")
+    return RateLimiter(capacity=5, rate=5 / 60)
+
+def login_allowed(email):
+    ip = st.context.ip_address
+    return get_login_limiter().allow(f"email:{email.strip().lower()}", f"ip:{ip}" if ip else None)
+
+@timed("storage.authenticate")
 def authenticate(email, password):
-    df = load_users()
-    return not df[(df["Email"] == email) & (df["Password"] == password)].empty
+    repo = get_user_repo()
+    rec = repo.get(email)
+    ok = check_login(password, rec["Password"] if rec else None)
+    if ok and needs_rehash(rec["Password"]):
+        # plaintext rows (or an older work factor) are upgraded on login
+        repo.update(email, {"Password": hash_in_pool(password)})
+    return ok
 
 def get_user_record(email):
-    df = load_users()
-    row = df[df["Email"] == email]
-    if row.empty:
-        return None
-    return row.iloc[0].to_dict()
+    return get_writer().user(email)
 
+def get_intake_store():
+    return get_storage().intake
+
+@timed("storage.get_progress")
+@st.cache_data(max_entries=256, show_spinner=False)
+def get_progress(email, days, today, version):
+    # version is the user's data version: any write makes this a cache miss
+    return user_progress(get_intake_store(), email, days, datetime.date.fromisoformat(today))
+
+@timed("storage.add_intake")
 def add_intake(email, item, calories):
-    df = pd.read_csv(INTAKE_CSV)
-    new = {"Email": email, "Date": datetime.date.today().isoformat(), "Item": item, "Calories": calories}
-    df = pd.concat([df, pd.DataFrame([new])], ignore_index=True)
-    df.to_csv(INTAKE_CSV, index=False)
+    get_writer().add_intake(email, datetime.date.today().isoformat(), item, calories)
 
+@timed("storage.get_today_intake")
 def get_today_intake(email):
-    df = pd.read_csv(INTAKE_CSV)
-    today = datetime.date.today().isoformat()
-    user_df = df[(df["Email"] == email) & (df["Date"] == today)]
-    if user_df.empty:
+    recs = get_writer().for_day(email, datetime.date.today().isoformat())
+    if not recs:
         return 0, []
-    return user_df["Calories"].sum(), user_df.to_dict("records")
+    return sum(r["Calories"] for r in recs), recs
 
-def load_streaks():
-    with open(STREAKS_JSON, "r") as f:
-        return json.load(f)
-
-def save_streaks(d):
-    with open(STREAKS_JSON, "w") as f:
-        json.dump(d, f)
+@st.cache_resource
+def get_water_buffer():
+    # clicks are coalesced per user/day and written in batches (see WaterBuffer)
+    buf = WaterBuffer(get_intake_store(), on_flush=lambda keys: get_writer().changed(*{e for e, _ in keys}),
+                      on_error=lambda e: METRICS.incr("water_flush_errors"))
+    atexit.register(buf.close)
+    return buf
 
+@timed("storage.touch_user_streak")
 def touch_user_streak(email):
-    d = load_streaks()
-    now = datetime.date.today().isoformat()
-    rec = d.get(email, {})
-    if "first_active" not in rec:
-        rec["first_active"] = now
-    rec["last_active"] = now
-    d[email] = rec
-    save_streaks(d)
-
-def days_since_first_active(email):
-    d = load_streaks()
-    rec = d.get(email, {})
-    if "first_active" not in rec:
-        return 0
-    first = datetime.date.fromisoformat(rec["first_active"])
-    return (datetime.date.today() - first).days + 1
-
-# -------------------- Streamlit config --------------------
-favicon = None
-if LOGO2_B64:
-    favicon = "logo (2).png" if os.path.exists("logo (2).png") else ("logo.png" if os.path.exists("logo.png") else "💧")
-st.set_page_config(page_title="NuTradaILy", page_icon=favicon, layout="wide")
+    get_writer().touch(email, datetime.date.today())
+
+@timed("storage.get_streak")
+def get_streak(email):
+    rec = get_writer().streak(email)
+    if not rec:
+        return {"current": 0, "longest": 0, "active": 0}
+    # the cached streak only counts while the last active day is today or yesterday
+    last = datetime.date.fromisoformat(rec["Last"])
+    alive = (datetime.date.today() - last).days <= 1
+    return {"current": rec["Current"] if alive else 0, "longest": rec["Longest"], "active": rec["Active"]}
+
+# -------------------- Session user context --------------------
+# Everything the sidebar and pages show about the logged-in user, read once
+# per session (and per day) instead of on every rerun. Writes that change it
+# call invalidate_user_context(); writes from other sessions or replicas bump
+# the user's data version. get_writer().data_version() answers from memory: it
+# moves with this process's writes at once and re-reads the store's version
+# at most every VERSION_TTL seconds, so a plain rerun reads nothing from disk.
+@timed("storage.user_context")
+def build_user_context(email, version):
+    today = datetime.date.today()
+    rec = get_user_record(email)
+    image_key = rec.get("ProfileS3Key", "") if rec else ""
+    week = [today - datetime.timedelta(days=i) for i in range(6, -1, -1)]
+    active = set(get_writer().active_days(email, week[0], today))
+    return {
+        "email": email,
+        "day": today,
+        "version": version,
+        "record": rec,
+        "name": rec["Name"] if rec else email.split("@")[0],
+        "avatar_72": get_profile_b64(email, image_key, 72),
+        "avatar_140": get_profile_b64(email, image_key, 140),
+        "streak": get_streak(email),
+        "week": [(d, d in active) for d in week],
+    }
+
+def user_context():
+    email = st.session_state.get("current_user", "")
+    ctx = st.session_state.get("user_ctx")
+    version = get_writer().data_version(email)
+    if ctx is None or ctx["email"] != email or ctx["day"] != datetime.date.today() or ctx["version"] != version:
+        ctx = build_user_context(email, version)
+        st.session_state.user_ctx = ctx
+    return ctx
+
+def invalidate_user_context():
+    st.session_state.pop("user_ctx", None)
 
 # -------------------- CSS (white text, responsive, no white columns) --------------------
-GLOBAL_BG_CSS = f'background: url("data:image/jpg;base64,{GLOBAL_BG_B64}") center/cover fixed;' if GLOBAL_BG_B64 else ""
-LOGIN_BG_CSS = f'background: url("data:image/jpg;base64,{LOGIN_BG_B64}") center/cover fixed;' if LOGIN_BG_B64 else ""
+def bg_css(url):
+    return f'background: url("{url}") center/cover fixed;' if url else ""
 
-st.markdown(f"""
+def build_css(global_bg_css):
+    return f"""
 <style>
 /* background */
 [data-testid="stAppViewContainer"] {{
-    {GLOBAL_BG_CSS}
+    {global_bg_css}
     font-family: 'Poppins', sans-serif;
     color: #ffffff; /* white text globally */
 }}
@@ -297,6 +484,25 @@ div.block-container {{
     transition: height 0.5s ease;
 }}
 
+/* welcome flash: fades out in the browser, the script never waits for it */
+.welcome-flash {{
+    position: fixed;
+    left: 0;
+    right: 0;
+    top: 80px;
+    z-index: 10000;
+    text-align: center;
+    font-size: 40px;
+    font-weight: 900;
+    color: #fff;
+    pointer-events: none;
+    animation: welcome-fade 1.6s ease-in forwards;
+}}
+@keyframes welcome-fade {{
+    0%, 75% {{ opacity: 1; }}
+    100% {{ opacity: 0; visibility: hidden; }}
+}}
+
 /* footer styling */
 .footer {{
     font-size:12px;
@@ -311,11 +517,46 @@ div.block-container {{
     .form-card {{ width: 420px; }}
 }}
 </style>
-""", unsafe_allow_html=True)
+"""
+
+# -------------------- Startup --------------------
+# Everything that only depends on files on disk is done once per process: the
+# users.csv check, publishing the images and building the stylesheet. A rerun
+# (every click) only reads the cached result.
+@st.cache_resource(show_spinner=False)
+def init_app():
+    instrument_markdown(st)
+    if STORAGE_BACKEND == "csv":
+        ensure_files()
+    get_compactor()
+    urls = get_asset_urls()
+    favicon = urls["favicon"]
+    if favicon and favicon.startswith(STATIC_URL):
+        # a /app/static URL is handed to the browser as is, no file read per run
+        favicon = "/" + favicon
+    return {
+        "urls": urls,
+        "favicon": favicon,
+        "global_bg_css": bg_css(urls["global_bg"]),
+        "login_bg_css": bg_css(urls["login_bg"]),
+        "css": build_css(bg_css(urls["global_bg"])),
+    }
+
+APP = init_app()
+LOGO2_URL = APP["urls"]["logo"]
+TITLE2_URL = APP["urls"]["title"]
+LOGIN_BG_URL = APP["urls"]["login_bg"]
+GLOBAL_BG_URL = APP["urls"]["global_bg"]
+ABOUT_IMG_URL = APP["urls"]["about"]
+GLOBAL_BG_CSS = APP["global_bg_css"]
+LOGIN_BG_CSS = APP["login_bg_css"]
+
+st.set_page_config(page_title="NuTradaILy", page_icon=APP["favicon"], layout="wide")
+st.markdown(APP["css"], unsafe_allow_html=True)
 
 # -------------------- Helper UI functions --------------------
 def inject_login_bg():
-    if LOGIN_BG_B64:
+    if LOGIN_BG_URL:
         st.markdown(f"""
         <style>
         [data-testid="stAppViewContainer"] {{
@@ -325,7 +566,7 @@ def inject_login_bg():
         """, unsafe_allow_html=True)
 
 def inject_global_bg():
-    if GLOBAL_BG_B64:
+    if GLOBAL_BG_URL:
         st.markdown(f"""
         <style>
         [data-testid="stAppViewContainer"] {{
@@ -335,8 +576,8 @@ def inject_global_bg():
         """, unsafe_allow_html=True)
 
 def render_logo_top_center():
-    if LOGO2_B64:
-        st.markdown(f'<img src="data:image/png;base64,{LOGO2_B64}" class="logo-center"/>', unsafe_allow_html=True)
+    if LOGO2_URL:
+        st.markdown(f'<img src="{LOGO2_URL}" class="logo-center"/>', unsafe_allow_html=True)
     else:
         st.markdown("<h2 style='text-align:center;color:#fff;'>NuTradaILy</h2>", unsafe_allow_html=True)
 
@@ -364,9 +605,9 @@ def signup_form():
         password = st.text_input("Password", type="password", key="su_pass")
         height = st.number_input("Height (cm)", 50.0, 250.0, 170.0, key="su_height")
         weight = st.number_input("Weight (kg)", 10.0, 300.0, 65.0, key="su_weight")
-        gender = st.selectbox("Gender", ["Male", "Female", "Other"], key="su_gender")
-        activity = st.selectbox("Activity", ["Low", "Moderate", "High"], key="su_activity")
-        goal = st.selectbox("Goal", ["Weight Loss", "Weight Gain", "Maintenance"], key="su_goal")
+        gender = st.selectbox("Gender", GENDERS, key="su_gender")
+        activity = st.selectbox("Activity", PROFILE_ACTIVITIES, key="su_activity")
+        goal = st.selectbox("Goal", GOALS, key="su_goal")
         submitted = st.form_submit_button("Sign Up")
         if submitted:
             if not (name and email and password):
@@ -382,6 +623,7 @@ def signup_form():
                     st.session_state.show_welcome = True
                     st.session_state.welcome_name = name
                     touch_user_streak(email)
+                    invalidate_user_context()
                     st.rerun()
 
 def login_form():
@@ -390,29 +632,31 @@ def login_form():
         password = st.text_input("Password", type="password", key="li_pass")
         submitted = st.form_submit_button("Login")
         if submitted:
-            if authenticate(email, password):
+            if not login_allowed(email):
+                st.error("Too many login attempts. Please wait a minute and try again.")
+            elif authenticate(email, password):
                 st.session_state.logged_in = True
                 st.session_state.current_user = email
-                rec = get_user_record(email)
-                st.session_state.welcome_name = rec["Name"] if rec else email.split("@")[0]
+                touch_user_streak(email)
+                invalidate_user_context()
+                st.session_state.welcome_name = user_context()["name"]
                 st.session_state.show_welcome = True
                 if "login_time" not in st.session_state:
                     st.session_state.login_time = pretty_date(datetime.datetime.now())
-                touch_user_streak(email)
                 st.rerun()
             else:
                 st.error("Invalid email or password")
 
 # -------------------- Pages --------------------
+@timed("page.about_page")
 def about_page():
     inject_global_bg()
     render_logo_top_center()
     render_help_float()
     st.markdown('<div class="about-panel">', unsafe_allow_html=True)
     st.write("## About Us")
-    if os.path.exists("image.jpg"):
-        img_b64 = file_to_base64("image.jpg")
-        st.markdown(f'<img src="data:image/jpg;base64,{img_b64}" style="width:100%;border-radius:8px;margin-bottom:12px;">', unsafe_allow_html=True)
+    if ABOUT_IMG_URL:
+        st.markdown(f'<img src="{ABOUT_IMG_URL}" style="width:100%;border-radius:8px;margin-bottom:12px;">', unsafe_allow_html=True)
     st.text_area("Write About Us", value="Welcome to NuTradaILy — your modern wellness companion.", height=140, key="about_text")
     c1, c2, c3 = st.columns([1,1,1])
     with c1:
@@ -432,6 +676,7 @@ def about_page():
     st.markdown('</div>', unsafe_allow_html=True)
     st.markdown('<div class="footer">© NuTradaILy — All rights reserved</div>', unsafe_allow_html=True)
 
+@timed("page.profile_page")
 def profile_page():
     inject_global_bg()
     render_logo_top_center()
@@ -442,40 +687,47 @@ def profile_page():
         st.info("Login to view or edit your profile.")
     else:
         email = st.session_state["current_user"]
-        rec = get_user_record(email)
+        ctx = user_context()
+        rec = ctx["record"]
         if rec:
             # show title (2).png above profile pic in nav panel reflected here too
-            if TITLE2_B64:
-                st.markdown(f'<div style="text-align:center;margin-bottom:6px;"><img src="data:image/png;base64,{TITLE2_B64}" style="width:180px;"></div>', unsafe_allow_html=True)
+            if TITLE2_URL:
+                st.markdown(f'<div style="text-align:center;margin-bottom:6px;"><img src="{TITLE2_URL}" style="width:180px;"></div>', unsafe_allow_html=True)
             col1, col2 = st.columns([1,2])
             with col1:
-                b64 = get_profile_b64(email)
-                st.markdown(f'<img src="data:image/png;base64,{b64}" style="width:140px;border-radius:70px;">', unsafe_allow_html=True)
+                st.markdown(f'<img src="data:image/webp;base64,{ctx["avatar_140"]}" style="width:140px;border-radius:70px;">', unsafe_allow_html=True)
                 uploaded = st.file_uploader("Change picture", type=["png","jpg","jpeg"], key="pf_upload")
-                if uploaded:
+                # the uploader keeps its file across reruns; process each upload once
+                if uploaded and st.session_state.get("pf_upload_id") != uploaded.file_id:
                     saved = save_profile_image(email, uploaded)
+                    st.session_state.pf_upload_id = uploaded.file_id
                     if saved:
+                        update_user(email, {"ProfileS3Key": saved})
                         st.rerun()
             with col2:
                 new_name = st.text_input("Name", value=rec["Name"])
                 new_height = st.number_input("Height (cm)", 50.0, 250.0, float(rec.get("Height") if rec.get("Height") else 170.0))
                 new_weight = st.number_input("Weight (kg)", 10.0, 300.0, float(rec.get("Weight") if rec.get("Weight") else 65.0))
-                new_activity = st.selectbox("Activity", ["Low", "Moderate", "High"], index=["Low","Moderate","High"].index(rec.get("Activity")) if rec.get("Activity") in ["Low","Moderate","High"] else 1)
+                new_activity = st.selectbox("Activity", PROFILE_ACTIVITIES, index=PROFILE_ACTIVITIES.index(rec.get("Activity")) if rec.get("Activity") in PROFILE_ACTIVITIES else 1)
                 if st.button("Save profile"):
                     update_user(email, {"Name": new_name, "Height": new_height, "Weight": new_weight, "Activity": new_activity})
     st.markdown('</div>', unsafe_allow_html=True)
     st.markdown('<div class="footer">© NuTradaILy — All rights reserved</div>', unsafe_allow_html=True)
 
-def water_page():
-    inject_global_bg()
-    render_logo_top_center()
-    render_help_float()
-    st.markdown('<div class="panel">', unsafe_allow_html=True)
-    st.write("## Water Tracker")
+# The tracker is a fragment: a glass click reruns only this widget tree, not
+# the page chrome, the sidebar or the rest of the script.
+@st.fragment
+@timed("fragment.water_tracker")
+def water_tracker():
     daily_goal_l = st.number_input("Daily goal (liters)", 0.5, 10.0, 2.0, step=0.25, key="water_goal")
     glass_ml = st.number_input("Glass size (ml)", 50, 1000, 250, step=50, key="glass_size")
-    if "water_glasses" not in st.session_state:
-        st.session_state.water_glasses = 0
+    email = st.session_state["current_user"]
+    today = datetime.date.today().isoformat()
+    water = get_water_buffer()
+    if st.session_state.get("water_day") != (email, today):
+        st.session_state.water_glasses = water.get(email, today)[0]
+        st.session_state.water_day = (email, today)
+    before = st.session_state.water_glasses
     c1, c2, c3 = st.columns([1,1,1])
     with c1:
         if st.button("Add glass"):
@@ -487,6 +739,9 @@ def water_page():
     with c3:
         if st.button("Reset"):
             st.session_state.water_glasses = 0
+    if st.session_state.water_glasses != before:
+        glasses = st.session_state.water_glasses
+        water.record(email, today, glasses, glasses * glass_ml / 1000.0)
     # compute fill
     consumed_l = (st.session_state.water_glasses * glass_ml) / 1000.0
     pct = min(consumed_l / daily_goal_l, 1.0) if daily_goal_l else 0.0
@@ -506,9 +761,55 @@ def water_page():
     """
     st.markdown(html, unsafe_allow_html=True)
     st.progress(pct)
+
+@timed("page.water_page")
+def water_page():
+    inject_global_bg()
+    render_logo_top_center()
+    render_help_float()
+    st.markdown('<div class="panel">', unsafe_allow_html=True)
+    st.write("## Water Tracker")
+    water_tracker()
     st.markdown('</div>', unsafe_allow_html=True)
     st.markdown('<div class="footer">© NuTradaILy — All rights reserved</div>', unsafe_allow_html=True)
 
+# Search, manual entry and today's total rerun together as one fragment, so
+# typing a query or adding a food never reruns the page around it.
+@st.fragment
+@timed("fragment.intake_tracker")
+def intake_tracker(email):
+    target = st.number_input("Set daily calorie target", 800, 6000, 2000, key="cal_target")
+    q = st.text_input("Search food (try 'apple', 'rice', 'chiken curry', etc.)", key="food_search")
+    if q.strip():
+        matches = {f.name: f for f in get_food_index().search(q, limit=8)}
+        if matches:
+            name = st.selectbox("Matches", list(matches), key="food_pick",
+                                format_func=lambda n: f"{n.title()} — {matches[n].kcal_100g:.0f} kcal/100g")
+            food = matches[name]
+            sizes = dict(servings(food))
+            size = st.selectbox("Serving", list(sizes), key="food_serving")
+            cal = serving_kcal(food, sizes[size])
+            st.write(f"**{food.name.title()}** ({size}) — {cal} kcal")
+            if st.button("Add to intake", key="food_add"):
+                add_intake(email, f"{food.name} ({size})", cal)
+                st.success(f"Added {food.name} ({size}) — {cal} kcal")
+        else:
+            st.warning("Sorry for the inconvenience, we're working on it!")
+    with st.form("manual_food"):
+        item = st.text_input("Item name")
+        kcal = st.number_input("Calories", 0, 5000, 100)
+        ok = st.form_submit_button("Add manually")
+        if ok and item:
+            add_intake(email, item, kcal)
+            st.success("Added.")
+    today_sum, recs = get_today_intake(email)
+    st.metric("Today's calories", f"{today_sum} kcal")
+    st.progress(min(today_sum/target, 1.0))
+    if recs:
+        st.write("Entries:")
+        st.dataframe(pd.DataFrame(recs, columns=["Item", "Calories"]), hide_index=True, width="stretch")
+
+@timed("page.nutrition_page")
 def nutrition_page():
     inject_global_bg()
     render_logo_top_center()
@@ -518,64 +819,102 @@ def nutrition_page():
     weight = st.number_input("Weight (kg)", 30.0, 300.0, 65.0, key="nut_weight")
     height = st.number_input("Height (cm)", 120.0, 250.0, 170.0, key="nut_height")
     age = st.number_input("Age (years)", 10, 100, 25, key="nut_age")
-    gender = st.selectbox("Gender", ["Male", "Female", "Other"], key="nut_gender")
-    activity = st.selectbox("Activity level", ["Sedentary", "Light", "Moderate", "Active", "Very Active"], index=2, key="nut_activity")
-    activity_factors = {"Sedentary":1.2, "Light":1.375, "Moderate":1.55, "Active":1.725, "Very Active":1.9}
-    bmr = 10*weight + 6.25*height - 5*age + (5 if gender == "Male" else -161 if gender == "Female" else -78)
-    maintenance = bmr * activity_factors.get(activity, 1.55)
-    gain = maintenance + 500
-    loss = maintenance - 500
-    st.markdown(f"**Estimated maintenance:** {int(maintenance)} kcal · **To gain:** {int(gain)} kcal · **To lose:** {int(loss)} kcal")
+    gender = st.selectbox("Gender", GENDERS, key="nut_gender")
+    activity = st.selectbox("Activity level", CALCULATOR_ACTIVITIES, index=2, key="nut_activity")
+    t = targets(weight, height, age, gender, activity)
+    st.markdown(f"**Estimated maintenance:** {int(t['maintenance'])} kcal · **To gain:** {int(t['gain'])} kcal · **To lose:** {int(t['loss'])} kcal")
     st.write("### Daily calorie tracker")
     if not st.session_state.get("current_user"):
         st.info("Login to track your personal daily intake.")
     else:
-        email = st.session_state["current_user"]
-        target = st.number_input("Set daily calorie target", 800, 6000, 2000, key="cal_target")
-        q = st.text_input("Search food (try 'apple', 'rice (100g)', etc.)", key="food_search")
-        if st.button("Search food"):
-            key = q.strip().lower()
-            if key in FOOD_DB:
-                cal = FOOD_DB[key]["cal"]
-                st.write(f"**{q.title()}** — {cal} kcal")
-                if st.button("Add to intake", key=f"add_{q}"):
-                    add_intake(email, q, cal)
-                    st.success(f"Added {q} — {cal} kcal")
-            else:
-                st.warning("Sorry for the incconvinience, were working on it!")
-        with st.form("manual_food"):
-            item = st.text_input("Item name")
-            kcal = st.number_input("Calories", 0, 5000, 100)
-            ok = st.form_submit_button("Add manually")
-            if ok and item:
-                add_intake(email, item, kcal)
-                st.success("Added.")
-        today_sum, recs = get_today_intake(email)
-        st.metric("Today's calories", f"{today_sum} kcal")
-        st.progress(min(today_sum/target, 1.0))
-        if recs:
-            st.write("Entries:")
-            for r in recs:
-                st.write(f"- {r['Item']} — {r['Calories']} kcal")
+        intake_tracker(st.session_state["current_user"])
     st.markdown('</div>', unsafe_allow_html=True)
     st.markdown('<div class="footer">© NuTradaILy — All rights reserved</div>', unsafe_allow_html=True)
 
+@timed("chart.render_progress_png")
+@st.cache_data(max_entries=128, show_spinner=False)
+def render_progress_png(email, days, today, version):
+    # explicit Figure on the Agg canvas: no pyplot global state, nothing left open
+    daily, _ = get_progress(email, days, today, version)
+    fig = Figure(figsize=(6,3))
+    ax = fig.subplots()
+    ax.plot(daily.index, daily["Calories"], marker='o' if len(daily) <= 31 else None)
+    ax.set_ylabel("kcal")
+    ax2 = ax.twinx()
+    ax2.bar(daily.index, daily["Water"], alpha=0.3, color="#28a6ff")
+    ax2.set_ylabel("L")
+    ax.set_title("Daily calories and water")
+    fig.autofmt_xdate()
+    fig.tight_layout()
+    buf = BytesIO()
+    fig.savefig(buf, format="png")
+    fig.clear()
+    return buf.getvalue()
+
+@timed("page.progress_page")
 def progress_page():
     inject_global_bg()
     render_logo_top_center()
     render_help_float()
     st.markdown('<div class="panel">', unsafe_allow_html=True)
     st.write("## Weekly Progress")
-    dates = pd.date_range(datetime.datetime.now() - datetime.timedelta(days=6), datetime.datetime.now())
-    vals = [random.randint(40,100) for _ in dates]
-    plt.figure(figsize=(6,3))
-    plt.plot(dates, vals, marker='o')
-    plt.title("Weekly Performance")
-    plt.tight_layout()
-    st.pyplot(plt)
+    email = st.session_state["current_user"]
+    windows = {"Last 7 days": 7, "Last 4 weeks": 28, "Last 12 weeks": 84, "Last year": 365}
+    window = st.selectbox("Period", list(windows), key="progress_window")
+    mode = st.radio("Chart", ["Image", "Native"], horizontal=True, key="progress_chart_mode")
+    key = (email, windows[window], datetime.date.today().isoformat(), get_writer().data_version(email))
+    daily, weekly = get_progress(*key)
+    if mode == "Native":
+        st.line_chart(daily[["Calories"]])
+        st.bar_chart(daily[["Water"]])
+    else:
+        st.image(render_progress_png(*key), width="stretch")
+    st.write("### Weekly totals")
+    st.dataframe(weekly.rename(index=lambda d: d.date()).round(1), width="stretch")
+    st.markdown('</div>', unsafe_allow_html=True)
+    st.markdown('<div class="footer">© NuTradaILy — All rights reserved</div>', unsafe_allow_html=True)
+
+@timed("storage.get_history_page")
+@st.cache_data(max_entries=256, show_spinner=False)
+def get_history_page(email, start, end, page, page_size, version):
+    # one page of entries and the total; version makes any write a cache miss
+    rows, total = get_intake_store().history_page(email, start, end, page * page_size, page_size)
+    return pd.DataFrame(rows, columns=["Date", "Item", "Calories"]), total
+
+@timed("page.history_page")
+def history_page():
+    inject_global_bg()
+    render_logo_top_center()
+    render_help_float()
+    st.markdown('<div class="panel">', unsafe_allow_html=True)
+    st.write("## Intake history")
+    email = st.session_state["current_user"]
+    today = datetime.date.today()
+    c1, c2 = st.columns([2, 1])
+    span = c1.date_input("Dates", (today - datetime.timedelta(days=29), today), max_value=today, key="history_dates")
+    page_size = c2.selectbox("Per page", [25, 50, 100], key="history_page_size")
+    # the picker returns one date while the second end is being chosen
+    start, end = (span[0], span[-1]) if span else (today, today)
+    key = (email, start.isoformat(), end.isoformat())
+    version = get_writer().data_version(email)
+    page = st.session_state.get("history_page_no", 1)
+    df, total = get_history_page(*key, page - 1, page_size, version)
+    pages = max(1, -(-total // page_size))
+    if page > pages:
+        # the filters got narrower: go to the last page there is
+        page = st.session_state.history_page_no = pages
+        df, total = get_history_page(*key, page - 1, page_size, version)
+    if total:
+        st.caption(f"{total} entries · showing {(page - 1) * page_size + 1}–{(page - 1) * page_size + len(df)}")
+        st.dataframe(df, hide_index=True, width="stretch")
+    else:
+        st.info("No entries in this period.")
+    if pages > 1:
+        st.number_input(f"Page (of {pages})", 1, pages, key="history_page_no")
     st.markdown('</div>', unsafe_allow_html=True)
     st.markdown('<div class="footer">© NuTradaILy — All rights reserved</div>', unsafe_allow_html=True)
 
+@timed("page.streaks_page")
 def streaks_page():
     inject_global_bg()
     render_logo_top_center()
@@ -583,15 +922,72 @@ def streaks_page():
     st.markdown('<div class="panel">', unsafe_allow_html=True)
     st.write("## Streaks")
     if st.session_state.get("logged_in"):
-        email = st.session_state["current_user"]
-        days = days_since_first_active(email)
-        st.success(f"🔥 You’re on a {days}-day streak! Keep it up.")
+        ctx = user_context()
+        streak = ctx["streak"]
+        st.success(f"🔥 You’re on a {streak['current']}-day streak! Keep it up.")
+        st.write(f"Longest streak: **{streak['longest']}** days · Active days: **{streak['active']}**")
+        st.write("Last 7 days: " + " ".join("✅" if active else "⬜" for _, active in ctx["week"]))
     else:
         st.info("Login to see your streak.")
     st.markdown('</div>', unsafe_allow_html=True)
     st.markdown('<div class="footer">© NuTradaILy — All rights reserved</div>', unsafe_allow_html=True)
 
+# profile columns a user gets back in their export
+EXPORT_PROFILE_COLS = ["Name", "Email", "Height", "Weight", "Gender", "Activity", "Goal", "SignupDate"]
+
+@timed("page.data_page")
+def data_page():
+    inject_global_bg()
+    render_logo_top_center()
+    render_help_float()
+    st.markdown('<div class="panel">', unsafe_allow_html=True)
+    st.write("## Your data")
+    email = st.session_state["current_user"]
+    store = get_intake_store()
+    st.write("### Export")
+
+    def intake_csv():
+        get_writer().flush()  # entries added moments ago are still queued
+        return spool(export_intake(store, email))
+
+    def water_csv():
+        get_water_buffer().flush()  # clicks still waiting for the debounce belong in the file
+        return spool(export_water(store, email))
+
+    # deferred: the files are only built (chunk by chunk) when a button is clicked
+    c1, c2, c3 = st.columns(3)
+    c1.download_button("Intake (CSV)", intake_csv, file_name="nutra-intake.csv", mime="text/csv", on_click="ignore")
+    c2.download_button("Water (CSV)", water_csv, file_name="nutra-water.csv", mime="text/csv", on_click="ignore")
+    profile = pd.DataFrame([user_context()["record"] or {}], columns=EXPORT_PROFILE_COLS)
+    c3.download_button("Profile (CSV)", profile.to_csv(index=False), file_name="nutra-profile.csv",
+                       mime="text/csv", on_click="ignore")
+    st.write("### Import")
+    st.caption("CSV with a header row. Intake: Date, Item, Calories. Water: Date and Glasses and/or Liters. "
+               "Entries you already have are skipped.")
+    kind = st.radio("Import", ["Intake", "Water"], horizontal=True, key="import_kind")
+    uploaded = st.file_uploader("CSV file", type=["csv"], key="import_file")
+    # importing the same file twice adds nothing, so every click just runs it
+    if uploaded and st.button("Import", key="import_go"):
+        uploaded.seek(0)
+        with st.spinner("Importing…"):
+            if kind == "Water":
+                # pending clicks first, so today's tracked value is what the import sees
+                get_water_buffer().flush()
+                report = import_water(store, uploaded, email)
+            else:
+                # queued entries first, so the duplicate check sees them
+                get_writer().flush()
+                report = import_intake(store, uploaded, email)
+        METRICS.incr("import_rows_added", report["added"])
+        get_writer().changed(email)
+        invalidate_user_context()
+        st.success(f"Imported {report['added']} of {report['rows']} rows · "
+                   f"{report['duplicates']} already there · {report['invalid']} invalid")
+    st.markdown('</div>', unsafe_allow_html=True)
+    st.markdown('<div class="footer">© NuTradaILy — All rights reserved</div>', unsafe_allow_html=True)
+
 # -------------------- Entry screen --------------------
+@timed("page.entry_screen")
 def entry_screen():
     inject_login_bg()
     render_logo_top_center()
@@ -622,51 +1018,81 @@ def entry_screen():
 # -------------------- Sidebar & routing --------------------
 def sidebar_nav():
     # show title (2).png at top of sidebar
-    if TITLE2_B64:
-        st.sidebar.markdown(f'<div style="text-align:center;margin-top:10px;"><img src="data:image/png;base64,{TITLE2_B64}" style="width:180px;"></div>', unsafe_allow_html=True)
+    if TITLE2_URL:
+        st.sidebar.markdown(f'<div style="text-align:center;margin-top:10px;"><img src="{TITLE2_URL}" style="width:180px;"></div>', unsafe_allow_html=True)
     else:
         st.sidebar.markdown("<h3 style='text-align:center;color:#fff;'>NuTradaILy</h3>", unsafe_allow_html=True)
 
     st.sidebar.markdown("---")
     # profile block under title
     if st.session_state.get("logged_in"):
-        email = st.session_state.get("current_user", "")
-        b64 = get_profile_b64(email)
-        rec = get_user_record(email)
-        name = rec["Name"] if rec else email.split("@")[0]
-        st.sidebar.image(f"data:image/png;base64,{b64}", width=72)
-        st.sidebar.markdown(f"**{name}**  \n<small style='color:#ddd'>{email}</small>", unsafe_allow_html=True)
+        ctx = user_context()
+        st.sidebar.image(f"data:image/webp;base64,{ctx['avatar_72']}", width=72)
+        st.sidebar.markdown(f"**{ctx['name']}**  \n<small style='color:#ddd'>{ctx['email']}</small>", unsafe_allow_html=True)
     else:
         st.sidebar.markdown("<div style='color:#fff'>Not logged in</div>", unsafe_allow_html=True)
 
     st.sidebar.markdown("---")
-    choice = st.sidebar.selectbox("Navigate", ["About", "Profile", "Water", "Nutrition", "Progress", "Streaks"])
+    choice = st.sidebar.selectbox("Navigate", ["About", "Profile", "Water", "Nutrition", "Progress", "History", "Streaks", "Data"])
     st.sidebar.markdown("---")
     if st.sidebar.button("Logout"):
-        for k in ["logged_in", "show_welcome", "current_user", "login_time", "welcome_name"]:
+        get_water_buffer().flush()
+        for k in ["logged_in", "show_welcome", "current_user", "login_time", "welcome_name", "water_day", "water_glasses", "user_ctx"]:
             if k in st.session_state:
                 del st.session_state[k]
         st.rerun()
     return choice
 
+# -------------------- Metrics (hidden admin page) --------------------
+# Not in the navigation: with NUTRA_METRICS=1 it is served for
+# ?metrics=<NUTRA_METRICS_TOKEN>, and not at all while no token is set.
+METRICS_TOKEN = os.environ.get("NUTRA_METRICS_TOKEN", "")
+
+def metrics_requested():
+    given = st.query_params.get("metrics", "")
+    return METRICS_ENABLED and bool(METRICS_TOKEN) and hmac.compare_digest(given.encode(), METRICS_TOKEN.encode())
+
+def metrics_page():
+    st.write("## Metrics")
+    snap = METRICS.snapshot()
+    c1, c2 = st.columns(2)
+    c1.metric("st.markdown calls", snap["counters"].get("markdown_calls", 0))
+    c2.metric("st.markdown bytes", snap["counters"].get("markdown_bytes", 0))
+    for (name, value), col in zip(snap["gauges"].items(), st.columns(max(1, len(snap["gauges"])))):
+        col.metric(name, value)
+    rows = [{"Timer": name, **t} for name, t in snap["timers"].items()]
+    if rows:
+        st.dataframe(pd.DataFrame(rows), hide_index=True, width="stretch")
+    else:
+        st.info("Nothing recorded yet.")
+    d1, d2, d3 = st.columns(3)
+    d1.download_button("Export JSON", to_json(snap), file_name="nutra-metrics.json", mime="application/json")
+    d2.download_button("Export Prometheus", to_prometheus(snap), file_name="nutra-metrics.prom", mime="text/plain")
+    if d3.button("Reset"):
+        METRICS.reset()
+        st.rerun()
+
 # -------------------- Session defaults --------------------
 if "logged_in" not in st.session_state:
     st.session_state.logged_in = False
 if "show_welcome" not in st.session_state:
     st.session_state.show_welcome = False
 
-# welcome flash
+# welcome flash (rendered once, hidden client-side by the .welcome-flash animation)
 if st.session_state.get("show_welcome"):
     name = st.session_state.get("welcome_name", "Friend")
-    placeholder = st.empty()
-    placeholder.markdown(f"<div style='text-align:center;margin-top:80px;font-size:40px;font-weight:900;color:#fff;'>✨ Welcome, {name}! ✨</div>", unsafe_allow_html=True)
-    time.sleep(1.2)
-    placeholder.empty()
+    st.markdown(f"<div class='welcome-flash'>✨ Welcome, {name}! ✨</div>", unsafe_allow_html=True)
     st.session_state.show_welcome = False
 
 # main router
-if st.session_state.logged_in:
+if metrics_requested():
+    metrics_page()
+elif st.session_state.logged_in:
     choice = sidebar_nav()
+    if st.session_state.get("last_page") != choice:
+        # leaving a page persists any water clicks still waiting for the debounce
+        get_water_buffer().flush()
+        st.session_state.last_page = choice
     if choice == "About":
         about_page()
     elif choice == "Profile":
@@ -677,9 +1103,14 @@ if st.session_state.logged_in:
         nutrition_page()
     elif choice == "Progress":
         progress_page()
+    elif choice == "History":
+        history_page()
     elif choice == "Streaks":
         streaks_page()
+    elif choice == "Data":
+        data_page()
 else:
     entry_screen()
 
-
+if METRICS_ENABLED:
+    METRICS.observe("rerun", time.perf_counter() - RUN_START)
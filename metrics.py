@@ -0,0 +1,142 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Opt-in: with NUTRA_METRICS unset every helper below is a no-op and the
+# decorators hand back the undecorated function.
+ENABLED = os.environ.get("NUTRA_METRICS") == "1"
+# latencies kept per timer for the percentiles (most recent calls only)
+WINDOW = 2048
+
+
+class Metrics:
+    # Process-wide timers and counters, shared by every session thread.
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._timers = {}  # name -> [count, total seconds, deque of recent seconds]
+        self._counters = {}
+        self._gauges = {}
+
+    def observe(self, name, seconds):
+        with self._lock:
+            t = self._timers.get(name)
+            if t is None:
+                t = self._timers[name] = [0, 0.0, deque(maxlen=self.window)]
+            t[0] += 1
+            t[1] += seconds
+            t[2].append(seconds)
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def gauge(self, name, value):
+        # last value wins (queue depths and the like)
+        with self._lock:
+            self._gauges[name] = value
+
+    def reset(self):
+        with self._lock:
+            self._timers.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+    def snapshot(self):
+        with self._lock:
+            timers = {k: (c, s, sorted(r)) for k, (c, s, r) in self._timers.items()}
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+        out = {}
+        for name, (count, total, recent) in sorted(timers.items()):
+            out[name] = {
+                "count": count,
+                "total_ms": round(total * 1000, 3),
+                "p50_ms": round(_percentile(recent, 0.50) * 1000, 3),
+                "p95_ms": round(_percentile(recent, 0.95) * 1000, 3),
+            }
+        return {"timers": out, "counters": dict(sorted(counters.items())), "gauges": dict(sorted(gauges.items()))}
+
+
+def _percentile(ordered, q):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+METRICS = Metrics()
+
+
+def timed(name):
+    def wrap(fn):
+        if not ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                METRICS.observe(name, time.perf_counter() - start)
+        return inner
+    return wrap
+
+
+_markdown_patched = False
+
+
+def instrument_markdown(st):
+    # Counts calls and UTF-8 bytes of every st.markdown / st.sidebar.markdown
+    # body. Patched once per process on the DeltaGenerator class, plus the
+    # already-bound st.markdown.
+    global _markdown_patched
+    if not ENABLED or _markdown_patched:
+        return
+    from streamlit.delta_generator import DeltaGenerator
+    original = DeltaGenerator.markdown
+
+    @functools.wraps(original)
+    def markdown(self, body, *args, **kwargs):
+        METRICS.incr("markdown_calls")
+        METRICS.incr("markdown_bytes", len(str(body).encode("utf-8")))
+        return original(self, body, *args, **kwargs)
+
+    DeltaGenerator.markdown = markdown
+    st.markdown = st._main.markdown
+    _markdown_patched = True
+
+
+# -------------------- Export --------------------
+def to_json(snapshot=None):
+    return json.dumps(snapshot or METRICS.snapshot(), indent=2)
+
+
+def _prom_name(name):
+    return "".join(c if c.isalnum() else "_" for c in name)
+
+
+def to_prometheus(snapshot=None):
+    snap = snapshot or METRICS.snapshot()
+    lines = [
+        "# HELP nutra_call_seconds Latency of instrumented pages and storage calls.",
+        "# TYPE nutra_call_seconds summary",
+    ]
+    for name, t in snap["timers"].items():
+        label = f'name="{name}"'
+        lines.append(f'nutra_call_seconds{{{label},quantile="0.5"}} {t["p50_ms"] / 1000:.6f}')
+        lines.append(f'nutra_call_seconds{{{label},quantile="0.95"}} {t["p95_ms"] / 1000:.6f}')
+        lines.append(f"nutra_call_seconds_sum{{{label}}} {t['total_ms'] / 1000:.6f}")
+        lines.append(f"nutra_call_seconds_count{{{label}}} {t['count']}")
+    for name, value in snap["counters"].items():
+        metric = f"nutra_{_prom_name(name)}_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {value}")
+    for name, value in snap["gauges"].items():
+        metric = f"nutra_{_prom_name(name)}"
+        lines.append(f"# TYPE {metric} gauge")
+        lines.append(f"{metric} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+
+# Mifflin-St Jeor: 10*kg + 6.25*cm - 5*years + offset
+GENDER_OFFSETS = {"Male": 5, "Female": -161}
+OTHER_GENDER_OFFSET = -78
+ACTIVITY_FACTORS = {
+    "Sedentary": 1.2, "Light": 1.375, "Moderate": 1.55, "Active": 1.725, "Very Active": 1.9,
+    # the coarser levels stored by signup / profile
+    "Low": 1.2, "High": 1.725,
+}
+DEFAULT_ACTIVITY_FACTOR = 1.55
+GOAL_DELTA = 500
+GOAL_DELTAS = {"Weight Loss": -GOAL_DELTA, "Weight Gain": GOAL_DELTA, "Maintenance": 0}
+# the choices main.py offers: signup and profile store the coarse levels,
+# the Nutrition page's calculator uses the finer ones
+GENDERS = ["Male", "Female", "Other"]
+PROFILE_ACTIVITIES = ["Low", "Moderate", "High"]
+CALCULATOR_ACTIVITIES = ["Sedentary", "Light", "Moderate", "Active", "Very Active"]
+GOALS = list(GOAL_DELTAS)
+# users.csv has no age column
+DEFAULT_AGE = 25
+
+
+def _lookup(values, table, default):
+    # table lookup for a scalar or a whole array/Series, unknown keys -> default;
+    # factorized first, so the table is consulted once per distinct value
+    if not np.ndim(values):
+        return float(table.get(values, default))
+    codes, uniques = pd.factorize(values if isinstance(values, pd.Series) else np.atleast_1d(np.asarray(values, dtype=object)))
+    mapped = np.array([table.get(u, default) for u in uniques] + [default], dtype=float)
+    return mapped[codes]  # missing values have code -1: the trailing default
+
+
+def _numeric(values):
+    # users.csv columns are strings; blanks and junk become NaN
+    try:
+        return values.replace("", np.nan).astype(float)
+    except (TypeError, ValueError):
+        return pd.to_numeric(values, errors="coerce")
+
+
+def bmr(weight, height, age, gender):
+    weight, height, age = (np.asarray(v, dtype=float) for v in (weight, height, age))
+    return 10 * weight + 6.25 * height - 5 * age + _lookup(gender, GENDER_OFFSETS, OTHER_GENDER_OFFSET)
+
+
+def tdee(base, activity):
+    return np.asarray(base, dtype=float) * _lookup(activity, ACTIVITY_FACTORS, DEFAULT_ACTIVITY_FACTOR)
+
+
+def targets(weight, height, age, gender, activity):
+    # scalars in, floats out; arrays in, arrays out (all broadcast together)
+    base = bmr(weight, height, age, gender)
+    maintenance = tdee(base, activity)
+    return {"bmr": base, "maintenance": maintenance, "gain": maintenance + GOAL_DELTA, "loss": maintenance - GOAL_DELTA}
+
+
+def user_targets(users, age=DEFAULT_AGE):
+    # One row per user of a users.csv-shaped frame (Height/Weight/Gender/
+    # Activity/Goal), computed column-wise in one pass. Users without a usable
+    # height or weight get NaN.
+    weight = _numeric(users["Weight"])
+    height = _numeric(users["Height"])
+    ages = _numeric(users["Age"]).fillna(age) if "Age" in users else age
+    t = targets(weight, height, ages, users["Gender"], users["Activity"])
+    out = pd.DataFrame({
+        "Email": users["Email"],
+        "BMR": t["bmr"],
+        "Maintenance": t["maintenance"],
+        "Gain": t["gain"],
+        "Loss": t["loss"],
+    }, index=users.index)
+    out["Target"] = out["Maintenance"] + _lookup(users["Goal"], GOAL_DELTAS, 0)
+    return out
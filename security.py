@@ -0,0 +1,107 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# scrypt work factor; raise NUTRA_SCRYPT_N and stored hashes are upgraded on login
+SCRYPT_N = int(os.environ.get("NUTRA_SCRYPT_N", 2 ** 14))
+SCRYPT_R = 8
+SCRYPT_P = 1
+HASH_PREFIX = "scrypt$"
+
+# verifications run here, never more than HASH_WORKERS at a time, so a burst of
+# logins cannot occupy every script thread (or scrypt's memory) at once
+HASH_WORKERS = int(os.environ.get("NUTRA_HASH_WORKERS", 2))
+_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="pwhash")
+
+
+def _b64(raw):
+    return base64.b64encode(raw).decode()
+
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, dklen=32, maxmem=256 * r * n)
+
+
+def hash_password(password, n=None):
+    n = n or SCRYPT_N
+    salt = secrets.token_bytes(16)
+    return f"{HASH_PREFIX}{n}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(_scrypt(password, salt, n, SCRYPT_R, SCRYPT_P))}"
+
+
+def is_hashed(stored):
+    return str(stored).startswith(HASH_PREFIX)
+
+
+def verify_password(password, stored):
+    stored = str(stored)
+    if stored in ("", "nan", "None"):
+        # a blank password cell (read as "" or as pandas' NaN) matches nothing
+        return False
+    if not is_hashed(stored):
+        # legacy plaintext row; compared in constant time and upgraded by the caller
+        return hmac.compare_digest(password.encode(), stored.encode())
+    try:
+        n, r, p, salt, digest = stored[len(HASH_PREFIX):].split("$")
+        expected = base64.b64decode(digest)
+        actual = _scrypt(password, base64.b64decode(salt), int(n), int(r), int(p))
+    except ValueError:
+        return False
+    return hmac.compare_digest(actual, expected)
+
+
+def needs_rehash(stored):
+    return not is_hashed(stored) or stored[len(HASH_PREFIX):].split("$", 1)[0] != str(SCRYPT_N)
+
+
+# unknown emails are checked against this so they cost the same as real ones
+_DUMMY_HASH = None
+
+
+def check_login(password, stored):
+    global _DUMMY_HASH
+    if stored is None:
+        if _DUMMY_HASH is None:
+            _DUMMY_HASH = hash_password(secrets.token_hex(8))
+        _pool.submit(verify_password, password, _DUMMY_HASH).result()
+        return False
+    return _pool.submit(verify_password, password, stored).result()
+
+
+def hash_in_pool(password):
+    return _pool.submit(hash_password, password).result()
+
+
+# -------------------- Rate limiting --------------------
+class RateLimiter:
+    # In-memory token buckets, e.g. per email and per client IP: `capacity`
+    # attempts in a burst, refilled at `rate` tokens per second. Only the most
+    # recently used `max_keys` buckets are kept.
+    def __init__(self, capacity=5, rate=5 / 60, max_keys=100_000):
+        self.capacity = capacity
+        self.rate = rate
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def _tokens(self, key, now):
+        tokens, stamp = self._buckets.get(key, (self.capacity, now))
+        return min(self.capacity, tokens + (now - stamp) * self.rate)
+
+    def allow(self, *keys):
+        # takes one token from every bucket, or none if any of them is empty
+        now = time.monotonic()
+        with self._lock:
+            levels = {k: self._tokens(k, now) for k in keys if k}
+            ok = all(t >= 1 for t in levels.values())
+            for k, t in levels.items():
+                self._buckets[k] = (t - 1 if ok else t, now)
+                self._buckets.move_to_end(k)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return ok
@@ -0,0 +1,79 @@
+# Persistence behind one interface with interchangeable backends, picked by
+# name (NUTRA_STORAGE in main.py). Every backend provides the same four
+# stores, with the same methods:
+#
+#   users    get, exists, frame, add (None on duplicate), update
+#   intake   add, add_many, for_day, history, history_page (newest first, with
+#            the total), get_water, set_water_many, data_version, daily_totals,
+#            and for bulk import/export add_new, set_water_new (skip what is
+#            stored), iter_intake, iter_water
+#   streaks  get, touch, active_days
+#   images   put, get, etag, delete (sha256/... content keys are write-once)
+#
+# "sqlite" (default) keeps everything in one WAL-mode database and imports
+# the CSV/JSON files the first time it opens them; "csv" reads and writes the
+# original users.csv / intake.csv / streaks.json layout. Given an archive_dir
+# (and pyarrow), the sqlite intake store can compact old months into Parquet;
+# a Compactor runs that in the background.
+#
+# Several app processes on one host can share one sqlite database (and the
+# profiles and archive directories): every write bumps the user's row in
+# user_versions, which is what caches compare against, and SqliteRateLimiter
+# keeps the login buckets in the same file. The database must be on a local
+# disk, as SQLite is not safe over a network filesystem. Replicas on several
+# hosts use "remote" instead: a StoreServer (python -m storage.remote) owns the
+# sqlite database and serves these stores over TCP to RemoteStore clients.
+# WriteBehind puts a queue and a worker thread in front of a Storage, so
+# page writes return at once and are committed in batches.
+from collections import namedtuple
+
+from .archive import Compactor, IntakeArchive
+from .csvfiles import CsvIntakeStore, JsonStreakStore, UserRepository
+from .images import LocalImageStore, S3ImageStore, content_key, is_content_key, variant_key
+from .remote import RemoteStore, StoreServer, parse_address
+from .sqlite import (
+    INTAKE_COLS, WATER_COLS, IntakeStore, SqliteRateLimiter, SqliteStore, SqliteUserStore, StreakStore,
+)
+from .water import WaterBuffer
+from .writebehind import WriteBehind
+
+BACKENDS = ("sqlite", "csv", "remote")
+
+Storage = namedtuple("Storage", ["backend", "users", "intake", "streaks", "images"])
+
+
+def open_storage(backend, user_cols, db_path="nutra.db", users_csv="users.csv", intake_csv="intake.csv",
+                 water_csv="water.csv", streaks_json="streaks.json", profiles_dir="profiles", archive_dir=None,
+                 s3_bucket=None, s3_endpoint=None, remote_address=None, remote_key=None):
+    # pictures go to S3 (or a MinIO-style endpoint) when a bucket is given
+    images = S3ImageStore(s3_bucket, endpoint_url=s3_endpoint) if s3_bucket else LocalImageStore(profiles_dir)
+    if backend == "remote":
+        # remote_address is (host, port) or "host:port" of a StoreServer
+        if not remote_address or not remote_key:
+            raise ValueError("the remote backend needs remote_address and remote_key")
+        address = parse_address(remote_address) if isinstance(remote_address, str) else remote_address
+        users, intake, streaks, served_images = (RemoteStore(address, remote_key, part)
+                                                 for part in ("users", "intake", "streaks", "images"))
+        return Storage(backend, users, intake, streaks, images if s3_bucket else served_images)
+    if backend == "csv":
+        return Storage(backend, UserRepository(users_csv, user_cols), CsvIntakeStore(intake_csv, water_csv),
+                       JsonStreakStore(streaks_json), images)
+    if backend != "sqlite":
+        raise ValueError(f"unknown storage backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+    users = SqliteUserStore(db_path, user_cols)
+    users.migrate_csv(users_csv)
+    archive = IntakeArchive(archive_dir) if archive_dir and IntakeArchive.available() else None
+    intake = IntakeStore(db_path, archive)
+    intake.migrate_csv(intake_csv)
+    intake.migrate_water_csv(water_csv)
+    streaks = StreakStore(db_path)
+    streaks.migrate_json(streaks_json)
+    return Storage(backend, users, intake, streaks, images)
+
+
+__all__ = [
+    "BACKENDS", "INTAKE_COLS", "Compactor", "CsvIntakeStore", "IntakeArchive", "IntakeStore", "JsonStreakStore",
+    "LocalImageStore", "RemoteStore", "S3ImageStore", "SqliteRateLimiter", "SqliteStore", "SqliteUserStore",
+    "Storage", "StoreServer", "StreakStore", "UserRepository", "WATER_COLS", "WaterBuffer", "WriteBehind",
+    "content_key", "is_content_key", "open_storage", "parse_address", "variant_key",
+]
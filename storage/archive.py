@@ -0,0 +1,214 @@
+import datetime
+import logging
+import os
+import shutil
+import threading
+import zlib
+
+from fileio import file_lock
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow ships with streamlit, but the archive stays optional
+    pa = pq = None
+
+log = logging.getLogger(__name__)
+
+# users are spread over this many hash buckets inside every month
+BUCKETS = 16
+ARCHIVE_COLS = ["Email", "Date", "Item", "Calories"]
+
+
+def bucket_of(email):
+    return zlib.crc32(email.encode("utf-8")) % BUCKETS
+
+
+def months_between(start, end):
+    # "YYYY-MM" for every month overlapping [start, end] (ISO dates)
+    y, m = int(start[:4]), int(start[5:7])
+    out = []
+    while f"{y:04d}-{m:02d}" <= end[:7]:
+        out.append(f"{y:04d}-{m:02d}")
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return out
+
+
+def month_start(day, months_back=0):
+    y, m = day.year, day.month - months_back
+    while m < 1:
+        y, m = y - 1, m + 12
+    return datetime.date(y, m, 1)
+
+
+class IntakeArchive:
+    # Old intake rows as Parquet under root/month=YYYY-MM/bucket=NN/, one part
+    # file per compaction batch, rows sorted by Email and Date so row-group
+    # statistics skip other users. A read only opens the files of the months
+    # it covers and of the user's bucket, and only the columns it asks for.
+    #
+    # A batch is written to root/_staging/<batch>/ first and moved into place
+    # by publish() once the hot store has committed the matching delete.
+    def __init__(self, root):
+        self.root = root
+        self.staging = os.path.join(root, "_staging")
+        self.schema = pa.schema([
+            ("Email", pa.string()), ("Date", pa.string()), ("Item", pa.string()), ("Calories", pa.float64()),
+        ])
+
+    @staticmethod
+    def available():
+        return pa is not None
+
+    def lock(self):
+        # one compaction at a time across processes
+        os.makedirs(self.root, exist_ok=True)
+        return file_lock(os.path.join(self.root, "compact"))
+
+    def _part_dir(self, base, month, bucket):
+        return os.path.join(base, f"month={month}", f"bucket={bucket:02d}")
+
+    def stage(self, batch, rows):
+        # rows: (Email, Date, Item, Calories) tuples of one or more months
+        groups = {}
+        for row in rows:
+            groups.setdefault((row[1][:7], bucket_of(row[0])), []).append(row)
+        base = os.path.join(self.staging, batch)
+        for (month, bucket), part in groups.items():
+            part.sort(key=lambda r: (r[0], r[1]))
+            table = pa.Table.from_pylist([dict(zip(ARCHIVE_COLS, r)) for r in part], schema=self.schema)
+            d = self._part_dir(base, month, bucket)
+            os.makedirs(d, exist_ok=True)
+            pq.write_table(table, os.path.join(d, f"part-{batch}.parquet"), row_group_size=8192, compression="zstd")
+        return len(groups)
+
+    def staged_batches(self):
+        if not os.path.isdir(self.staging):
+            return []
+        return sorted(os.listdir(self.staging))
+
+    def publish(self, batch):
+        base = os.path.join(self.staging, batch)
+        for dirpath, _, files in os.walk(base):
+            for name in files:
+                target = os.path.join(self.root, os.path.relpath(dirpath, base))
+                os.makedirs(target, exist_ok=True)
+                os.replace(os.path.join(dirpath, name), os.path.join(target, name))
+        shutil.rmtree(base, ignore_errors=True)
+
+    def discard(self, batch):
+        shutil.rmtree(os.path.join(self.staging, batch), ignore_errors=True)
+
+    def _files(self, months, bucket=None):
+        for month in months:
+            month_dir = os.path.join(self.root, f"month={month}")
+            if not os.path.isdir(month_dir):
+                continue
+            buckets = [f"bucket={bucket:02d}"] if bucket is not None else sorted(os.listdir(month_dir))
+            for b in buckets:
+                d = os.path.join(month_dir, b)
+                if os.path.isdir(d):
+                    yield from (os.path.join(d, f) for f in sorted(os.listdir(d)) if f.endswith(".parquet"))
+
+    def months(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(d[len("month="):] for d in os.listdir(self.root) if d.startswith("month="))
+
+    def read(self, email, start, end, columns=None):
+        # one user's archived rows in [start, end] as dicts, oldest first
+        columns = columns or ARCHIVE_COLS
+        filters = [("Email", "=", email), ("Date", ">=", start), ("Date", "<=", end)]
+        rows = []
+        for path in self._files(months_between(start, end), bucket_of(email)):
+            rows.extend(pq.read_table(path, columns=columns, filters=filters).to_pylist())
+        if "Date" in columns:
+            rows.sort(key=lambda r: r["Date"])
+        return rows
+
+    def count(self, email, start, end):
+        # how many archived rows one user has in [start, end]; reads only Date
+        filters = [("Email", "=", email), ("Date", ">=", start), ("Date", "<=", end)]
+        return sum(pq.read_table(path, columns=["Date"], filters=filters).num_rows
+                   for path in self._files(months_between(start, end), bucket_of(email)))
+
+    def month_counts(self, email, start, end):
+        # {"YYYY-MM": rows} of one user's archived entries in [start, end],
+        # months without any left out; reads only Date
+        counts = {}
+        for month in self.months():
+            if start[:7] <= month <= end[:7]:
+                n = self.count(email, max(start, f"{month}-01"), min(end, f"{month}-31"))
+                if n:
+                    counts[month] = n
+        return counts
+
+    def read_many(self, emails, start, end, columns=None):
+        # several users' archived rows in [start, end] as one Table (None when
+        # there are none), opening only the buckets those users hash to
+        emails = sorted(set(emails))
+        filters = [("Email", "in", emails), ("Date", ">=", start), ("Date", "<=", end)]
+        tables = []
+        for bucket in sorted({bucket_of(e) for e in emails}):
+            for path in self._files(months_between(start, end), bucket):
+                table = pq.read_table(path, columns=columns or ARCHIVE_COLS, filters=filters)
+                if table.num_rows:
+                    tables.append(table)
+        return pa.concat_tables(tables) if tables else None
+
+    def scan(self, start, end, columns=None):
+        # every user's archived rows in [start, end], one pyarrow Table per part file
+        filters = [("Date", ">=", start), ("Date", "<=", end)]
+        for path in self._files(months_between(start, end)):
+            table = pq.read_table(path, columns=columns or ARCHIVE_COLS, filters=filters)
+            if table.num_rows:
+                yield table
+
+
+class Compactor:
+    # Background thread that moves intake older than the `hot_months` most
+    # recent months (the current one included) into the archive every
+    # `interval` seconds. The store does the work in short transactions, so
+    # page renders only ever wait for the final delete of a month.
+    def __init__(self, store, hot_months=2, interval=6 * 3600, first_delay=60, on_run=None, on_error=None):
+        self.store = store
+        self.hot_months = max(1, hot_months)
+        self.interval = interval
+        self.first_delay = first_delay
+        self.on_run = on_run  # (rows moved)
+        self.on_error = on_error  # (exception) of a failed background run
+        self._stop = threading.Event()
+        self._thread = None
+
+    def cutoff(self, today=None):
+        return month_start(today or datetime.date.today(), self.hot_months - 1).isoformat()
+
+    def run_once(self):
+        moved = self.store.compact(self.cutoff())
+        if self.on_run:
+            self.on_run(moved)
+        return moved
+
+    def _loop(self):
+        delay = self.first_delay
+        while not self._stop.wait(delay):
+            delay = self.interval
+            try:
+                self.run_once()
+            except Exception as e:
+                # a failed run leaves staged files for the next run to recover
+                log.exception("intake compaction failed, retrying in %ss", self.interval)
+                if self.on_error:
+                    try:
+                        self.on_error(e)
+                    except Exception:
+                        log.exception("compaction on_error callback failed")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="intake-compactor", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
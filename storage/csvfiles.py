@@ -0,0 +1,335 @@
+import csv
+import datetime
+import json
+import os
+import threading
+
+import pandas as pd
+
+from fileio import atomic_write, file_lock
+
+from .sqlite import INTAKE_COLS, WATER_COLS
+
+
+def file_stamp(path):
+    try:
+        info = os.stat(path)
+    except FileNotFoundError:
+        return None
+    # rewrites are renames (new inode) and appends change the size, so this
+    # catches writes landing within the same mtime tick
+    return info.st_ino, info.st_mtime_ns, info.st_size
+
+
+# -------------------- Users --------------------
+class UserRepository:
+    # email -> record index over users.csv. The file is only re-parsed when its
+    # inode/mtime/size change (another process wrote it); our own writes update the
+    # index in place. Re-reads and writes hold the users.csv file lock, so a
+    # write always starts from the latest file and never drops another's row.
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = list(columns)
+        self._lock = threading.RLock()
+        self._stamp = None
+        self._index = {}
+
+    def _file_stamp(self):
+        return file_stamp(self.path)
+
+    def _refresh(self):
+        if self._file_stamp() == self._stamp:
+            return
+        with file_lock(self.path):
+            stamp = self._file_stamp()
+            index = {}
+            if stamp is not None:
+                df = pd.read_csv(self.path, dtype=str, keep_default_na=False)
+                for col in self.columns:
+                    if col not in df.columns:
+                        df[col] = ""
+                for rec in df[self.columns].to_dict("records"):
+                    index.setdefault(rec["Email"], rec)
+            self._index = index
+            self._stamp = stamp
+
+    def get(self, email):
+        with self._lock:
+            self._refresh()
+            rec = self._index.get(email)
+            return dict(rec) if rec else None
+
+    def exists(self, email):
+        with self._lock:
+            self._refresh()
+            return email in self._index
+
+    def frame(self):
+        with self._lock:
+            self._refresh()
+            return pd.DataFrame(list(self._index.values()), columns=self.columns)
+
+    def add(self, record):
+        # new users are appended as a single CSV line
+        rec = {col: "" if record.get(col) is None else str(record.get(col)) for col in self.columns}
+        with self._lock, file_lock(self.path):
+            self._refresh()
+            if rec["Email"] in self._index:
+                return None
+            new_file = self._stamp is None
+            with open(self.path, "a", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=self.columns, lineterminator="\n")
+                if new_file:
+                    writer.writeheader()
+                writer.writerow(rec)
+                f.flush()
+                os.fsync(f.fileno())
+            self._index[rec["Email"]] = rec
+            self._stamp = self._file_stamp()
+        return rec
+
+    def update(self, email, updates):
+        # updates rewrite the table to a temp file and rename it into place, so
+        # readers never see a half-written users.csv
+        with self._lock, file_lock(self.path):
+            self._refresh()
+            rec = self._index.get(email)
+            if rec is None:
+                return None
+            rec = dict(rec)
+            for k, v in updates.items():
+                if k in self.columns:
+                    rec[k] = "" if v is None else str(v)
+            index = dict(self._index)
+            index[email] = rec
+
+            def write(f):
+                writer = csv.DictWriter(f, fieldnames=self.columns, lineterminator="\n")
+                writer.writeheader()
+                writer.writerows(index.values())
+
+            atomic_write(self.path, write)
+            self._index = index
+            self._stamp = self._file_stamp()
+            return dict(rec)
+
+
+# -------------------- Intake and water --------------------
+class CsvIntakeStore:
+    # The original layout: intake.csv (one line per entry) and water.csv (one
+    # row per user and day). Each file is parsed whole and cached until its
+    # stamp changes; appends are single lines under the file lock. Every write
+    # means a re-parse on the next read, so this only suits small installs.
+    def __init__(self, intake_csv, water_csv):
+        self.intake_csv = intake_csv
+        self.water_csv = water_csv
+        self._lock = threading.Lock()
+        self._cache = {}
+
+    def _load(self, path, parse):
+        stamp = file_stamp(path)
+        with self._lock:
+            hit = self._cache.get(path)
+            if hit and hit[0] == stamp:
+                return hit[1]
+        with file_lock(path):
+            stamp = file_stamp(path)
+            value = parse(path if stamp else None)
+        with self._lock:
+            self._cache[path] = (stamp, value)
+        return value
+
+    def _intake(self):
+        def parse(path):
+            if path is None:
+                return pd.DataFrame(columns=INTAKE_COLS)
+            df = pd.read_csv(path, dtype={"Email": str, "Date": str, "Item": str})
+            for col in INTAKE_COLS:
+                if col not in df.columns:
+                    df[col] = ""
+            df["Calories"] = pd.to_numeric(df["Calories"], errors="coerce").fillna(0)
+            return df[INTAKE_COLS]
+        return self._load(self.intake_csv, parse)
+
+    def _water(self):
+        def parse(path):
+            if path is None:
+                return {}
+            df = pd.read_csv(path, dtype={"Email": str, "Date": str})
+            return {(r.Email, r.Date): (int(r.Glasses), float(r.Liters)) for r in df[WATER_COLS].itertuples(index=False)}
+        return self._load(self.water_csv, parse)
+
+    def add(self, email, date, item, calories):
+        self.add_many([(email, date, item, calories)])
+
+    def add_many(self, rows):
+        rows = list(rows)
+        with file_lock(self.intake_csv):
+            new_file = file_stamp(self.intake_csv) is None
+            with open(self.intake_csv, "a", newline="") as f:
+                writer = csv.writer(f, lineterminator="\n")
+                if new_file:
+                    writer.writerow(INTAKE_COLS)
+                writer.writerows(rows)
+                f.flush()
+                os.fsync(f.fileno())
+        return len(rows)
+
+    def add_new(self, rows):
+        # rows not in intake.csv yet (repeats within `rows` count once); the
+        # check re-reads the whole file, like every other read of this backend
+        rows = list(dict.fromkeys((e, d, str(i), float(c)) for e, d, i, c in rows))
+        with file_lock(self.intake_csv):
+            df = self._intake()
+            stored = set(zip(df["Email"], df["Date"], df["Item"].astype(str), df["Calories"].astype(float)))
+            new = [r for r in rows if r not in stored]
+            if new:
+                self.add_many(new)
+        return len(new)
+
+    def for_day(self, email, date):
+        df = self._intake()
+        return df[(df["Email"] == email) & (df["Date"] == date)].to_dict("records")
+
+    def history(self, email, start, end):
+        df = self._intake()
+        rows = df[(df["Email"] == email) & (df["Date"] >= start) & (df["Date"] <= end)]
+        return rows.sort_values("Date", kind="stable").to_dict("records")
+
+    def history_page(self, email, start, end, offset, limit):
+        df = self._intake()
+        rows = df[(df["Email"] == email) & (df["Date"] >= start) & (df["Date"] <= end)]
+        rows = rows.iloc[::-1].sort_values("Date", ascending=False, kind="stable")
+        return rows.iloc[offset:offset + limit].to_dict("records"), len(rows)
+
+    def get_water(self, email, date):
+        return self._water().get((email, date), (0, 0.0))
+
+    def set_water_many(self, entries):
+        with file_lock(self.water_csv):
+            water = dict(self._water())
+            water.update(entries)
+
+            def write(f):
+                writer = csv.writer(f, lineterminator="\n")
+                writer.writerow(WATER_COLS)
+                writer.writerows((e, d, g, l) for (e, d), (g, l) in water.items())
+
+            atomic_write(self.water_csv, write)
+
+    def set_water_new(self, entries):
+        # only days without a logged value
+        with file_lock(self.water_csv):
+            water = self._water()
+            new = {k: v for k, v in entries.items() if k not in water}
+            if new:
+                self.set_water_many(new)
+        return len(new)
+
+    def iter_intake(self, email=None, chunksize=10_000):
+        df = self._intake()
+        if email is not None:
+            df = df[df["Email"] == email]
+        df = df.sort_values(["Email", "Date"], kind="stable")
+        for i in range(0, len(df), chunksize):
+            yield list(df.iloc[i:i + chunksize].itertuples(index=False, name=None))
+
+    def iter_water(self, email=None, chunksize=10_000):
+        rows = sorted((e, d, g, l) for (e, d), (g, l) in self._water().items() if email is None or e == email)
+        for i in range(0, len(rows), chunksize):
+            yield rows[i:i + chunksize]
+
+    def data_version(self, email):
+        # no per-user counter in the files: any write to either one changes it
+        return f"{file_stamp(self.intake_csv)}/{file_stamp(self.water_csv)}"
+
+    def daily_totals(self, email, start, end):
+        df = self._intake()
+        calories = df[(df["Email"] == email) & (df["Date"] >= start) & (df["Date"] <= end)].groupby("Date")["Calories"].sum()
+        water = {d: liters for (e, d), (_, liters) in self._water().items() if e == email and start <= d <= end}
+        return [
+            {"Date": d, "Calories": float(calories.get(d, 0)), "Water": water.get(d, 0.0)}
+            for d in sorted(set(calories.index) | set(water))
+        ]
+
+
+# -------------------- Streaks --------------------
+class JsonStreakStore:
+    # streaks.json as the original app wrote it ({email: {first_active,
+    # last_active}}), extended with the streak counters and the list of
+    # active days. Rewritten whole, atomically, on every change.
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._stamp = None
+        self._data = {}
+
+    def _refresh(self):
+        if file_stamp(self.path) == self._stamp:
+            return
+        with file_lock(self.path):
+            stamp = file_stamp(self.path)
+            data = {}
+            if stamp is not None:
+                with open(self.path) as f:
+                    data = json.load(f)
+            self._data = data
+            self._stamp = stamp
+
+    @staticmethod
+    def _entry(rec):
+        # records from the original app only have first/last activity
+        days = rec.get("active_days") or sorted({rec["first_active"], rec.get("last_active", rec["first_active"])})
+        return {
+            "First": rec["first_active"],
+            "Last": rec.get("last_active", rec["first_active"]),
+            "Current": rec.get("current", 1),
+            "Longest": rec.get("longest", 1),
+            "Active": len(days),
+            "Days": days,
+        }
+
+    def get(self, email):
+        with self._lock:
+            self._refresh()
+            rec = self._data.get(email)
+            if not rec or "first_active" not in rec:
+                return None
+            entry = self._entry(rec)
+            del entry["Days"]
+            return entry
+
+    def touch(self, email, day):
+        iso = day.isoformat()
+        with self._lock, file_lock(self.path):
+            self._refresh()
+            rec = self._data.get(email)
+            if not rec or "first_active" not in rec:
+                new = {"first_active": iso, "last_active": iso, "current": 1, "longest": 1, "active_days": [iso]}
+            else:
+                entry = self._entry(rec)
+                last = datetime.date.fromisoformat(entry["Last"])
+                if day <= last:
+                    return
+                current = entry["Current"] + 1 if (day - last).days == 1 else 1
+                new = {
+                    "first_active": entry["First"],
+                    "last_active": iso,
+                    "current": current,
+                    "longest": max(current, entry["Longest"]),
+                    "active_days": entry["Days"] + [iso],
+                }
+            data = dict(self._data)
+            data[email] = new
+            atomic_write(self.path, lambda f: json.dump(data, f))
+            self._data = data
+            self._stamp = file_stamp(self.path)
+
+    def active_days(self, email, start, end):
+        with self._lock:
+            self._refresh()
+            rec = self._data.get(email)
+        if not rec or "first_active" not in rec:
+            return []
+        lo, hi = start.isoformat(), end.isoformat()
+        return [datetime.date.fromisoformat(d) for d in self._entry(rec)["Days"] if lo <= d <= hi]
@@ -0,0 +1,119 @@
+import hashlib
+import os
+
+from fileio import atomic_write
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+except ImportError:  # only needed for S3ImageStore
+    boto3 = ClientError = None
+
+# content-addressed keys: "sha256/<64 hex digits><ext>", e.g. ".png" or "_72.webp"
+CONTENT_PREFIX = "sha256/"
+
+
+def content_key(data, ext):
+    return f"{CONTENT_PREFIX}{hashlib.sha256(data).hexdigest()}{ext}"
+
+
+def is_content_key(key):
+    return bool(key) and key.startswith(CONTENT_PREFIX)
+
+
+def variant_key(key, suffix):
+    # a derived object (a thumbnail) of a content-addressed original: the same
+    # original always maps to the same variant key, so variants dedupe too
+    return os.path.splitext(key)[0] + suffix
+
+
+class LocalImageStore:
+    # Profile pictures as files under `root`, addressed by key (a file name,
+    # or sha256/<hash><ext> for content-addressed ones). Content keys are
+    # immutable: putting one that exists is a no-op, and its hash is its etag.
+    # Other keys can be rewritten; their etag changes with every write.
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, key):
+        return os.path.join(self.root, *key.split("/"))
+
+    def put(self, key, data):
+        path = self.path(key)
+        if is_content_key(key) and os.path.exists(path):
+            return key
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        atomic_write(path, lambda f: f.write(data), binary=True)
+        return key
+
+    def get(self, key):
+        try:
+            with open(self.path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def etag(self, key):
+        if is_content_key(key):
+            return key if os.path.exists(self.path(key)) else None
+        try:
+            return str(os.stat(self.path(key)).st_mtime_ns)
+        except FileNotFoundError:
+            return None
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+
+class S3ImageStore:
+    # The same interface on an S3-compatible bucket (AWS, or a MinIO-style
+    # server via endpoint_url). Content keys are written once: a HEAD first
+    # skips the upload when the object already exists. etag() is a HEAD, so a
+    # changed object is noticed without downloading it again; for content keys
+    # it only confirms the object exists, as their key is their etag.
+    def __init__(self, bucket, prefix="profiles/", endpoint_url=None, client=None):
+        if client is None:
+            if boto3 is None:
+                raise RuntimeError("S3ImageStore needs boto3 (pip install -r requirements-s3.txt)")
+            client = boto3.client("s3", endpoint_url=endpoint_url)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    @staticmethod
+    def available():
+        return boto3 is not None
+
+    def _head(self, key):
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self.prefix + key)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def put(self, key, data):
+        if is_content_key(key) and self._head(key) is not None:
+            return key
+        self.client.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=data)
+        return key
+
+    def get(self, key):
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self.prefix + key)["Body"].read()
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def etag(self, key):
+        head = self._head(key)
+        if head is None:
+            return None
+        return key if is_content_key(key) else head["ETag"]
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self.prefix + key)
@@ -0,0 +1,175 @@
+# The stores served over the network, for app replicas on several hosts.
+# SQLite cannot be shared over NFS/SMB, so one store server owns the database
+# (and the archive and profile pictures, unless those are on S3) on its local
+# disk, and every replica opens the "remote" backend: RemoteStore objects with
+# the same methods as the local stores, each call one request over TCP.
+#
+#   NUTRA_STORE_KEY=... python -m storage.remote --listen 0.0.0.0:7070 --db nutra.db --archive archive
+#
+# Requests are pickled (multiprocessing.connection) after an HMAC handshake
+# on NUTRA_STORE_KEY, so only hosts holding the key can connect; keep the port
+# on the replicas' private network all the same.
+import argparse
+import logging
+import os
+import threading
+from multiprocessing.connection import Client, Listener
+
+# what each part serves, the methods of the storage interface (see __init__.py)
+METHODS = {
+    "users": {"get", "exists", "frame", "add", "update"},
+    "intake": {"add", "add_many", "for_day", "history", "history_page", "get_water", "set_water_many",
+               "data_version", "daily_totals", "add_new", "set_water_new", "iter_intake", "iter_water"},
+    "streaks": {"get", "touch", "active_days"},
+    "images": {"put", "get", "etag", "delete"},
+    "limiter": {"allow"},
+}
+# generators (of row chunks), sent back one item per message
+STREAMED = {"iter_intake", "iter_water"}
+
+
+def parse_address(text):
+    host, _, port = text.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+class StoreServer:
+    # Serves the parts of a Storage (and a login rate limiter) to RemoteStore
+    # clients, one thread per connection. Errors raised by a store are sent
+    # back and raised again in the client.
+    def __init__(self, storage, address, authkey, limiter=None):
+        if not authkey:
+            raise ValueError("StoreServer needs an authkey")
+        self.parts = {"users": storage.users, "intake": storage.intake, "streaks": storage.streaks,
+                      "images": storage.images, "limiter": limiter}
+        self.listener = Listener(address, authkey=authkey)
+        self.address = self.listener.address
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="nutra-store-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        while True:
+            try:
+                conn = self.listener.accept()
+            except OSError:  # closed
+                return
+            except Exception:  # a client without the key
+                continue
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def close(self):
+        self.listener.close()
+
+    def _serve(self, conn):
+        with conn:
+            while True:
+                try:
+                    part, method, args, kwargs = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    store = self.parts.get(part)
+                    if store is None or method not in METHODS[part]:
+                        raise AttributeError(f"{part}.{method} is not served")
+                    result = getattr(store, method)(*args, **kwargs)
+                    if method in STREAMED:
+                        for item in result:
+                            conn.send(("item", item))
+                        result = None
+                    reply = ("ok", result)
+                except (EOFError, OSError) as e:
+                    if conn.closed:
+                        return
+                    reply = ("error", e)
+                except Exception as e:
+                    reply = ("error", e)
+                try:
+                    conn.send(reply)
+                except (EOFError, OSError):
+                    return
+                except Exception as e:  # an exception that does not pickle
+                    conn.send(("error", RuntimeError(f"{type(reply[1]).__name__}: {e}")))
+
+
+class RemoteStore:
+    # One part ("users", "intake", "streaks", "images" or "limiter") of the
+    # storage a StoreServer serves, with the same methods as the local store.
+    # Each thread keeps its own connection; a broken one raises and is
+    # replaced on the next call. Calls are not retried, as an add that
+    # reached the server before the connection broke would be written twice.
+    archive = None  # compaction runs on the server, next to the database
+
+    def __init__(self, address, authkey, part):
+        self.address = address
+        self.authkey = authkey
+        self.part = part
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = Client(self.address, authkey=self.authkey)
+        return conn
+
+    def _call(self, method, args, kwargs):
+        conn = self._conn()
+        try:
+            conn.send((self.part, method, args, kwargs))
+            status, value = conn.recv()
+        except (EOFError, OSError):
+            self._local.conn = None
+            conn.close()
+            raise
+        if status == "error":
+            raise value
+        return value
+
+    def _stream(self, method, args, kwargs):
+        # its own connection, so the caller can use the store while iterating
+        with Client(self.address, authkey=self.authkey) as conn:
+            conn.send((self.part, method, args, kwargs))
+            while True:
+                status, value = conn.recv()
+                if status == "error":
+                    raise value
+                if status == "ok":
+                    return
+                yield value
+
+    def __getattr__(self, method):
+        if method.startswith("_") or method not in METHODS[self.part]:
+            raise AttributeError(method)
+        if method in STREAMED:
+            return lambda *args, **kwargs: self._stream(method, args, kwargs)
+        return lambda *args, **kwargs: self._call(method, args, kwargs)
+
+
+def main(argv=None):
+    from . import Compactor, SqliteRateLimiter, open_storage
+
+    parser = argparse.ArgumentParser(description="serve the sqlite storage to app replicas on other hosts")
+    parser.add_argument("--listen", default="127.0.0.1:7070", help="host:port")
+    parser.add_argument("--db", default="nutra.db")
+    parser.add_argument("--profiles", default="profiles")
+    parser.add_argument("--archive", default=None, help="compact old intake into Parquet here")
+    parser.add_argument("--hot-months", type=int, default=2)
+    parser.add_argument("--user-cols", required=True, help="comma-separated, main.USER_COLS")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    authkey = os.environ.get("NUTRA_STORE_KEY", "").encode()
+    storage = open_storage("sqlite", args.user_cols.split(","), db_path=args.db, profiles_dir=args.profiles,
+                           archive_dir=args.archive)
+    if storage.intake.archive is not None:
+        Compactor(storage.intake, args.hot_months).start()
+    limiter = SqliteRateLimiter(args.db, capacity=5, rate=5 / 60)
+    server = StoreServer(storage, parse_address(args.listen), authkey, limiter)
+    print(f"serving {args.db} on {args.listen}", flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,646 @@
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+INTAKE_COLS = ["Email", "Date", "Item", "Calories"]
+WATER_COLS = ["Email", "Date", "Glasses", "Liters"]
+
+# user_versions is shared by every store in the database: any write for a
+# user bumps it, so caches (in this process or another replica's) key on it
+META_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS user_versions (
+    Email TEXT PRIMARY KEY,
+    Version INTEGER NOT NULL
+);
+"""
+
+INTAKE_SCHEMA = META_SCHEMA + """
+CREATE TABLE IF NOT EXISTS intake (
+    id INTEGER PRIMARY KEY,
+    Email TEXT NOT NULL,
+    Date TEXT NOT NULL,
+    Item TEXT NOT NULL,
+    Calories NUMERIC NOT NULL
+);
+CREATE INDEX IF NOT EXISTS intake_email_date ON intake (Email, Date);
+CREATE TABLE IF NOT EXISTS daily_totals (
+    Email TEXT NOT NULL,
+    Date TEXT NOT NULL,
+    Calories NUMERIC NOT NULL DEFAULT 0,
+    Water REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (Email, Date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS water_log (
+    Email TEXT NOT NULL,
+    Date TEXT NOT NULL,
+    Glasses INTEGER NOT NULL,
+    Liters REAL NOT NULL,
+    PRIMARY KEY (Email, Date)
+) WITHOUT ROWID;
+"""
+
+# Days is a bitmap: bit k is set when the user was active on First + k days
+STREAK_SCHEMA = META_SCHEMA + """
+CREATE TABLE IF NOT EXISTS streaks (
+    Email TEXT PRIMARY KEY,
+    First TEXT NOT NULL,
+    Last TEXT NOT NULL,
+    Current INTEGER NOT NULL,
+    Longest INTEGER NOT NULL,
+    Active INTEGER NOT NULL,
+    Days BLOB NOT NULL
+);
+"""
+
+# token buckets of the shared login rate limiter (Stamp is wall-clock seconds)
+RATE_LIMIT_SCHEMA = META_SCHEMA + """
+CREATE TABLE IF NOT EXISTS rate_buckets (
+    Key TEXT PRIMARY KEY,
+    Tokens REAL NOT NULL,
+    Stamp REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+# recomputes the calorie column of daily_totals from the raw log (water is kept)
+REBUILD_DAILY_CALORIES = """
+INSERT INTO daily_totals (Email, Date, Calories)
+SELECT Email, Date, SUM(Calories) FROM intake WHERE true GROUP BY Email, Date
+ON CONFLICT (Email, Date) DO UPDATE SET Calories = excluded.Calories
+"""
+
+BUMP_VERSION = """
+INSERT INTO user_versions (Email, Version) VALUES (?, 1)
+ON CONFLICT (Email) DO UPDATE SET Version = Version + 1
+"""
+
+# imports: rows staged in a temp table, inserted unless an identical entry exists
+IMPORT_STAGING = "CREATE TEMP TABLE IF NOT EXISTS import_rows (Email TEXT, Date TEXT, Item TEXT, Calories NUMERIC)"
+IMPORT_NEW_ROWS = """
+INSERT INTO intake (Email, Date, Item, Calories)
+SELECT Email, Date, Item, Calories FROM import_rows i WHERE NOT EXISTS (
+    SELECT 1 FROM intake x
+    WHERE x.Email = i.Email AND x.Date = i.Date AND x.Item = i.Item AND x.Calories = i.Calories
+)
+"""
+
+
+# -------------------- SQLite stores --------------------
+class SqliteStore:
+    # SQLite in WAL mode: every write is its own transaction and readers never
+    # block the writer. Subclasses provide the schema and one-time setup.
+    # The file must be on a local disk: WAL (and SQLite locking in general)
+    # is not safe over NFS/SMB, so every process sharing it runs on one host.
+    schema = META_SCHEMA
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            conn.executescript(self.schema)
+            self._setup(conn)
+
+    def _setup(self, conn):
+        pass
+
+    def _conn(self):
+        # sqlite3 connections are not shared between threads, and every
+        # Streamlit session runs its script on its own thread.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # statements are constant SQL with ? parameters, so the per-connection
+            # statement cache hands back the already prepared ones
+            conn = sqlite3.connect(self.path, timeout=30, cached_statements=256)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+
+# -------------------- User store --------------------
+class SqliteUserStore(SqliteStore):
+    # users.csv as a table keyed by Email: lookups and writes touch one row
+    # instead of the whole file. Same methods as UserRepository.
+    def __init__(self, path, columns):
+        self.columns = list(columns)
+        cols = ", ".join(f'"{c}" TEXT NOT NULL DEFAULT \'\'' for c in self.columns if c != "Email")
+        self.schema = META_SCHEMA + f"CREATE TABLE IF NOT EXISTS users (Email TEXT PRIMARY KEY, {cols});"
+        self._select = "SELECT " + ", ".join(f'"{c}"' for c in self.columns) + " FROM users"
+        super().__init__(path)
+
+    def _setup(self, conn):
+        # columns added to USER_COLS later are added to an existing table
+        have = {row[1] for row in conn.execute("PRAGMA table_info(users)")}
+        for c in self.columns:
+            if c not in have:
+                conn.execute(f'ALTER TABLE users ADD COLUMN "{c}" TEXT NOT NULL DEFAULT \'\'')
+
+    def _record(self, record):
+        return {col: "" if record.get(col) is None else str(record.get(col)) for col in self.columns}
+
+    def get(self, email):
+        row = self._conn().execute(self._select + " WHERE Email = ?", (email,)).fetchone()
+        return dict(row) if row else None
+
+    def exists(self, email):
+        return self._conn().execute("SELECT 1 FROM users WHERE Email = ?", (email,)).fetchone() is not None
+
+    def frame(self):
+        return pd.read_sql_query(self._select + " ORDER BY rowid", self._conn())
+
+    def add(self, record):
+        rec = self._record(record)
+        cols = ", ".join(f'"{c}"' for c in self.columns)
+        with self._conn() as conn:
+            cur = conn.execute(
+                f"INSERT INTO users ({cols}) VALUES ({', '.join('?' * len(self.columns))}) ON CONFLICT (Email) DO NOTHING",
+                [rec[c] for c in self.columns],
+            )
+            if cur.rowcount:
+                conn.execute(BUMP_VERSION, (rec["Email"],))
+        return rec if cur.rowcount else None
+
+    def update(self, email, updates):
+        changes = {k: "" if v is None else str(v) for k, v in updates.items() if k in self.columns and k != "Email"}
+        with self._conn() as conn:
+            if changes:
+                cur = conn.execute(
+                    "UPDATE users SET " + ", ".join(f'"{k}" = ?' for k in changes) + " WHERE Email = ?",
+                    [*changes.values(), email],
+                )
+                if cur.rowcount:
+                    conn.execute(BUMP_VERSION, (email,))
+            row = conn.execute(self._select + " WHERE Email = ?", (email,)).fetchone()
+        return dict(row) if row else None
+
+    def migrate_csv(self, csv_path):
+        # One-shot import of users.csv; the first row per email wins, as it did
+        # in the CSV index. Marker and rows commit together.
+        if not os.path.exists(csv_path):
+            return 0
+        conn = self._conn()
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'users_csv_migrated'").fetchone():
+            return 0
+        df = pd.read_csv(csv_path, dtype=str, keep_default_na=False)
+        for col in self.columns:
+            if col not in df.columns:
+                df[col] = ""
+        df = df[df["Email"] != ""]
+        cols = ", ".join(f'"{c}"' for c in self.columns)
+        with conn:
+            conn.executemany(
+                f"INSERT OR IGNORE INTO users ({cols}) VALUES ({', '.join('?' * len(self.columns))})",
+                df[self.columns].itertuples(index=False, name=None),
+            )
+            conn.execute("INSERT INTO meta (key, value) VALUES ('users_csv_migrated', ?)", (str(len(df)),))
+        os.replace(csv_path, csv_path + ".migrated")
+        return len(df)
+
+
+# -------------------- Intake store --------------------
+class IntakeStore(SqliteStore):
+    # Appends are a single indexed INSERT. daily_totals is kept up to date in
+    # the same transaction, so charts never rescan the raw log. With an
+    # archive (IntakeArchive), compact() moves old rows out to Parquet and
+    # history() reads both.
+    schema = INTAKE_SCHEMA
+
+    def __init__(self, path, archive=None):
+        self.archive = archive
+        super().__init__(path)
+
+    def _setup(self, conn):
+        if not conn.execute("SELECT 1 FROM meta WHERE key = 'daily_totals_built'").fetchone():
+            conn.execute(REBUILD_DAILY_CALORIES)
+            conn.execute("INSERT INTO meta (key, value) VALUES ('daily_totals_built', '1')")
+
+    def add(self, email, date, item, calories):
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO intake (Email, Date, Item, Calories) VALUES (?, ?, ?, ?)",
+                (email, date, item, calories),
+            )
+            conn.execute(
+                "INSERT INTO daily_totals (Email, Date, Calories) VALUES (?, ?, ?) "
+                "ON CONFLICT (Email, Date) DO UPDATE SET Calories = Calories + excluded.Calories",
+                (email, date, calories),
+            )
+            conn.execute(BUMP_VERSION, (email,))
+
+    def add_many(self, rows):
+        # group commit: rows is an iterable of (email, date, item, calories),
+        # all written (with their daily totals) in a single transaction
+        rows = list(rows)
+        with self._conn() as conn:
+            conn.executemany("INSERT INTO intake (Email, Date, Item, Calories) VALUES (?, ?, ?, ?)", rows)
+            conn.executemany(
+                "INSERT INTO daily_totals (Email, Date, Calories) VALUES (?, ?, ?) "
+                "ON CONFLICT (Email, Date) DO UPDATE SET Calories = Calories + excluded.Calories",
+                [(e, d, c) for e, d, _, c in rows],
+            )
+            conn.executemany(BUMP_VERSION, [(e,) for e in {r[0] for r in rows}])
+        return len(rows)
+
+    def for_day(self, email, date):
+        rows = self._conn().execute(
+            "SELECT Email, Date, Item, Calories FROM intake WHERE Email = ? AND Date = ? ORDER BY id",
+            (email, date),
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    def get_water(self, email, date):
+        row = self._conn().execute(
+            "SELECT Glasses, Liters FROM water_log WHERE Email = ? AND Date = ?", (email, date)
+        ).fetchone()
+        return (row[0], row[1]) if row else (0, 0.0)
+
+    def set_water_many(self, entries):
+        # entries: {(email, date): (glasses, liters)}; one transaction per batch
+        with self._conn() as conn:
+            for (email, date), (glasses, liters) in entries.items():
+                conn.execute(
+                    "INSERT INTO water_log (Email, Date, Glasses, Liters) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (Email, Date) DO UPDATE SET Glasses = excluded.Glasses, Liters = excluded.Liters",
+                    (email, date, glasses, liters),
+                )
+                conn.execute(
+                    "INSERT INTO daily_totals (Email, Date, Water) VALUES (?, ?, ?) "
+                    "ON CONFLICT (Email, Date) DO UPDATE SET Water = excluded.Water",
+                    (email, date, liters),
+                )
+                conn.execute(BUMP_VERSION, (email,))
+
+    def data_version(self, email):
+        row = self._conn().execute("SELECT Version FROM user_versions WHERE Email = ?", (email,)).fetchone()
+        return row[0] if row else 0
+
+    def daily_totals(self, email, start, end):
+        # primary-key range scan over one user's [start, end] window
+        rows = self._conn().execute(
+            "SELECT Date, Calories, Water FROM daily_totals WHERE Email = ? AND Date BETWEEN ? AND ? ORDER BY Date",
+            (email, start, end),
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    def history(self, email, start, end):
+        # one user's entries in [start, end], oldest first: archived months
+        # from Parquet, everything not yet compacted from the hot table
+        rows = self.archive.read(email, start, end) if self.archive else []
+        rows += [dict(r) for r in self._conn().execute(
+            "SELECT Email, Date, Item, Calories FROM intake WHERE Email = ? AND Date BETWEEN ? AND ? ORDER BY Date, id",
+            (email, start, end),
+        )]
+        rows.sort(key=lambda r: r["Date"])
+        return rows
+
+    def history_page(self, email, start, end, offset, limit):
+        # One page of a user's entries in [start, end], newest first, and the
+        # total number of them. Without an archive a page is an (Email, Date)
+        # index range walked backwards. With one, the hot table can still hold
+        # rows dated in archived months (imports, backdated entries), so the
+        # page is built month by month from per-month counts of both: months
+        # before the page are only counted, and the months it covers merge
+        # their hot and archived rows by date (hot first within a day).
+        conn = self._conn()
+        if self.archive is None:
+            total = conn.execute(
+                "SELECT COUNT(*) FROM intake WHERE Email = ? AND Date BETWEEN ? AND ?", (email, start, end)
+            ).fetchone()[0]
+            return self._hot_page(email, start, end, offset, limit), total
+        hot = dict(conn.execute(
+            "SELECT substr(Date, 1, 7), COUNT(*) FROM intake WHERE Email = ? AND Date BETWEEN ? AND ? GROUP BY 1",
+            (email, start, end),
+        ).fetchall())
+        archived = self.archive.month_counts(email, start, end)
+        rows = []
+        for month in sorted(hot.keys() | archived.keys(), reverse=True):
+            n = hot.get(month, 0) + archived.get(month, 0)
+            if len(rows) >= limit or offset >= n:
+                offset = max(0, offset - n)
+                continue
+            lo, hi = max(start, f"{month}-01"), min(end, f"{month}-31")
+            want = offset + limit - len(rows)
+            merged = self._hot_page(email, lo, hi, 0, want) if month in hot else []
+            if month in archived:
+                merged += self.archive.read(email, lo, hi)[::-1]
+                merged.sort(key=lambda r: r["Date"], reverse=True)
+            rows += merged[offset:want]
+            offset = 0
+        return rows, sum(hot.values()) + sum(archived.values())
+
+    def _hot_page(self, email, start, end, offset, limit):
+        return [dict(r) for r in self._conn().execute(
+            "SELECT Email, Date, Item, Calories FROM intake WHERE Email = ? AND Date BETWEEN ? AND ? "
+            "ORDER BY Date DESC, id DESC LIMIT ? OFFSET ?",
+            (email, start, end, limit, offset),
+        )]
+
+    def add_new(self, rows):
+        # Import path: writes the (email, date, item, calories) rows that are not
+        # stored yet, in the hot table or the archive, and returns how many were
+        # new. Repeats within `rows` count once. One short transaction per call,
+        # so callers batch a large import and sessions keep writing in between.
+        rows = list(dict.fromkeys((e, d, str(i), float(c)) for e, d, i, c in rows))
+        if rows and self.archive is not None:
+            archived = self.archive.read_many({r[0] for r in rows}, min(r[1] for r in rows), max(r[1] for r in rows))
+            if archived is not None:
+                known = set(zip(*(archived.column(c).to_pylist() for c in INTAKE_COLS)))
+                rows = [r for r in rows if r not in known]
+        if not rows:
+            return 0
+        conn = self._conn()
+        conn.execute(IMPORT_STAGING)
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM import_rows")
+            conn.executemany("INSERT INTO import_rows (Email, Date, Item, Calories) VALUES (?, ?, ?, ?)", rows)
+            last = conn.execute("SELECT COALESCE(MAX(id), 0) FROM intake").fetchone()[0]
+            added = conn.execute(IMPORT_NEW_ROWS).rowcount
+            # NOT INDEXED: a rowid range over the new rows, not a walk of the whole (Email, Date) index
+            conn.execute(
+                "INSERT INTO daily_totals (Email, Date, Calories) "
+                "SELECT Email, Date, SUM(Calories) FROM intake NOT INDEXED WHERE id > ? GROUP BY Email, Date "
+                "ON CONFLICT (Email, Date) DO UPDATE SET Calories = Calories + excluded.Calories",
+                (last,),
+            )
+            conn.execute(
+                "INSERT INTO user_versions (Email, Version) SELECT DISTINCT Email, 1 FROM intake NOT INDEXED WHERE id > ? "
+                "ON CONFLICT (Email) DO UPDATE SET Version = Version + 1",
+                (last,),
+            )
+            conn.execute("DELETE FROM import_rows")
+        return added
+
+    def set_water_new(self, entries):
+        # Import path for water: only days without a logged value are written,
+        # so an import never overwrites what was tracked in the app.
+        added = 0
+        with self._conn() as conn:
+            for (email, date), (glasses, liters) in entries.items():
+                cur = conn.execute(
+                    "INSERT INTO water_log (Email, Date, Glasses, Liters) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (Email, Date) DO NOTHING",
+                    (email, date, glasses, liters),
+                )
+                if cur.rowcount:
+                    conn.execute(
+                        "INSERT INTO daily_totals (Email, Date, Water) VALUES (?, ?, ?) "
+                        "ON CONFLICT (Email, Date) DO UPDATE SET Water = excluded.Water",
+                        (email, date, liters),
+                    )
+                    conn.execute(BUMP_VERSION, (email,))
+                    added += 1
+        return added
+
+    def iter_intake(self, email=None, chunksize=10_000):
+        # Export path: every entry of one user (or of everyone) as lists of at
+        # most `chunksize` (Email, Date, Item, Calories) tuples, archived
+        # months first, so no more than one chunk is ever held in memory.
+        if self.archive is not None:
+            for month in self.archive.months():
+                start, end = f"{month}-01", f"{month}-31"
+                if email is None:
+                    tables = self.archive.scan(start, end)
+                else:
+                    table = self.archive.read_many([email], start, end)
+                    tables = [table] if table is not None else []
+                for table in tables:
+                    for batch in table.to_batches(chunksize):
+                        yield list(zip(*(batch.column(c).to_pylist() for c in INTAKE_COLS)))
+        where, params = ("WHERE Email = ? ", (email,)) if email is not None else ("", ())
+        cur = self._conn().execute(
+            f"SELECT Email, Date, Item, Calories FROM intake {where}ORDER BY Email, Date, id", params
+        )
+        while rows := cur.fetchmany(chunksize):
+            yield [tuple(r) for r in rows]
+
+    def iter_water(self, email=None, chunksize=10_000):
+        where, params = ("WHERE Email = ? ", (email,)) if email is not None else ("", ())
+        cur = self._conn().execute(f"SELECT Email, Date, Glasses, Liters FROM water_log {where}ORDER BY Email, Date", params)
+        while rows := cur.fetchmany(chunksize):
+            yield [tuple(r) for r in rows]
+
+    def compact(self, before):
+        # Moves entries dated before `before` (ISO date) into the archive, a
+        # month at a time. Each month is staged to Parquet outside any
+        # transaction; the delete and a batch marker then commit together, and
+        # only then is the batch published. A crash in between is finished (or
+        # rolled back) by the next run. daily_totals is left as it is.
+        if self.archive is None:
+            return 0
+        conn = self._conn()
+        moved = 0
+        with self.archive.lock():
+            self._recover_archive()
+            months = [r[0] for r in conn.execute(
+                "SELECT DISTINCT substr(Date, 1, 7) FROM intake WHERE Date < ? ORDER BY 1", (before,)
+            )]
+            for month in months:
+                rows = conn.execute(
+                    "SELECT id, Email, Date, Item, Calories FROM intake WHERE Date >= ? AND Date < ? AND Date < ?",
+                    (f"{month}-01", f"{month}-99", before),
+                ).fetchall()
+                if not rows:
+                    continue
+                batch = f"{month}-{os.urandom(4).hex()}"
+                self.archive.stage(batch, [(r["Email"], r["Date"], r["Item"], float(r["Calories"])) for r in rows])
+                with conn:
+                    # rows logged meanwhile have a larger id and stay in the hot table
+                    conn.execute(
+                        "DELETE FROM intake WHERE Date >= ? AND Date < ? AND Date < ? AND id <= ?",
+                        (f"{month}-01", f"{month}-99", before, max(r["id"] for r in rows)),
+                    )
+                    conn.execute("INSERT INTO meta (key, value) VALUES (?, 'committed')", (f"archive_batch:{batch}",))
+                self._publish_batch(batch)
+                moved += len(rows)
+        return moved
+
+    def _publish_batch(self, batch):
+        self.archive.publish(batch)
+        with self._conn() as conn:
+            conn.execute("DELETE FROM meta WHERE key = ?", (f"archive_batch:{batch}",))
+
+    def _recover_archive(self):
+        for batch in self.archive.staged_batches():
+            if self._conn().execute("SELECT 1 FROM meta WHERE key = ?", (f"archive_batch:{batch}",)).fetchone():
+                self._publish_batch(batch)
+            else:
+                self.archive.discard(batch)
+
+    def migrate_csv(self, csv_path, chunksize=50_000):
+        # One-shot import of the legacy intake.csv. The marker is written in the
+        # same transaction as the rows, so a crash can never import twice.
+        if not os.path.exists(csv_path):
+            return 0
+        conn = self._conn()
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'intake_csv_migrated'").fetchone():
+            return 0
+        count = 0
+        with conn:
+            for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+                for col in INTAKE_COLS:
+                    if col not in chunk.columns:
+                        chunk[col] = ""
+                chunk = chunk[INTAKE_COLS].dropna(subset=["Email", "Date"])
+                chunk["Calories"] = pd.to_numeric(chunk["Calories"], errors="coerce").fillna(0)
+                rows = chunk.astype({"Email": str, "Date": str, "Item": str}).itertuples(index=False, name=None)
+                conn.executemany("INSERT INTO intake (Email, Date, Item, Calories) VALUES (?, ?, ?, ?)", rows)
+                count += len(chunk)
+            conn.execute(REBUILD_DAILY_CALORIES)
+            conn.execute(
+                "INSERT INTO user_versions (Email, Version) SELECT DISTINCT Email, 1 FROM intake WHERE true "
+                "ON CONFLICT (Email) DO UPDATE SET Version = Version + 1"
+            )
+            conn.execute("INSERT INTO meta (key, value) VALUES ('intake_csv_migrated', ?)", (str(count),))
+        os.replace(csv_path, csv_path + ".migrated")
+        return count
+
+    def migrate_water_csv(self, csv_path):
+        # water.csv is written by the CSV backend; imported once when switching.
+        # The rows are upserts, so a retry after a crash imports nothing twice.
+        if not os.path.exists(csv_path):
+            return 0
+        if self._conn().execute("SELECT 1 FROM meta WHERE key = 'water_csv_migrated'").fetchone():
+            return 0
+        df = pd.read_csv(csv_path, dtype={"Email": str, "Date": str})
+        entries = {(r.Email, r.Date): (int(r.Glasses), float(r.Liters)) for r in df[WATER_COLS].itertuples(index=False)}
+        self.set_water_many(entries)
+        with self._conn() as conn:
+            conn.execute("INSERT INTO meta (key, value) VALUES ('water_csv_migrated', ?)", (str(len(entries)),))
+        os.replace(csv_path, csv_path + ".migrated")
+        return len(entries)
+
+
+
+# -------------------- Streak store --------------------
+def _set_bit(days, k):
+    days = days.ljust(k // 8 + 1, b"\0")
+    return days[:k // 8] + bytes([days[k // 8] | 1 << (k % 8)]) + days[k // 8 + 1:]
+
+
+class StreakStore(SqliteStore):
+    # One row per user with the current and longest streak cached next to a
+    # day bitmap, so recording activity reads and writes only that row.
+    schema = STREAK_SCHEMA
+
+    def get(self, email):
+        row = self._conn().execute(
+            "SELECT First, Last, Current, Longest, Active FROM streaks WHERE Email = ?", (email,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def touch(self, email, day):
+        conn = self._conn()
+        with conn:
+            # BEGIN IMMEDIATE takes the write lock before the read, so two
+            # sessions touching the same user cannot both miss each other
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT First, Last, Current, Longest, Active, Days FROM streaks WHERE Email = ?", (email,)
+            ).fetchone()
+            if row is None:
+                conn.execute(
+                    "INSERT INTO streaks (Email, First, Last, Current, Longest, Active, Days) VALUES (?, ?, ?, 1, 1, 1, ?)",
+                    (email, day.isoformat(), day.isoformat(), b"\x01"),
+                )
+                conn.execute(BUMP_VERSION, (email,))
+                return
+            last = datetime.date.fromisoformat(row["Last"])
+            if day <= last:
+                return
+            current = row["Current"] + 1 if (day - last).days == 1 else 1
+            k = (day - datetime.date.fromisoformat(row["First"])).days
+            conn.execute(
+                "UPDATE streaks SET Last = ?, Current = ?, Longest = ?, Active = Active + 1, Days = ? WHERE Email = ?",
+                (day.isoformat(), current, max(current, row["Longest"]), _set_bit(row["Days"], k), email),
+            )
+            conn.execute(BUMP_VERSION, (email,))
+
+    def active_days(self, email, start, end):
+        # dates in [start, end] with activity, decoded from the bitmap
+        row = self._conn().execute("SELECT First, Days FROM streaks WHERE Email = ?", (email,)).fetchone()
+        if row is None:
+            return []
+        first = datetime.date.fromisoformat(row["First"])
+        days = row["Days"]
+        out = []
+        for k in range(max(0, (start - first).days), min(len(days) * 8, (end - first).days + 1)):
+            if days[k // 8] >> (k % 8) & 1:
+                out.append(first + datetime.timedelta(days=k))
+        return out
+
+    def migrate_json(self, json_path):
+        # The original streaks.json only knew first/last activity: both days are
+        # marked active and the current streak restarts from the last one. Files
+        # written by the CSV backend also carry the counters and every day.
+        if not os.path.exists(json_path):
+            return 0
+        with open(json_path) as f:
+            legacy = json.load(f)
+        conn = self._conn()
+        with conn:
+            for email, rec in legacy.items():
+                if "first_active" not in rec:
+                    continue
+                first = datetime.date.fromisoformat(rec["first_active"])
+                last = datetime.date.fromisoformat(rec.get("last_active", rec["first_active"]))
+                active = {first, last} | {datetime.date.fromisoformat(d) for d in rec.get("active_days", ())}
+                days = b""
+                for day in active:
+                    days = _set_bit(days, (day - first).days)
+                conn.execute(
+                    "INSERT OR IGNORE INTO streaks (Email, First, Last, Current, Longest, Active, Days) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (email, first.isoformat(), last.isoformat(), rec.get("current", 1), rec.get("longest", 1),
+                     len(active), days),
+                )
+        os.replace(json_path, json_path + ".migrated")
+        return len(legacy)
+
+
+# -------------------- Rate limiter --------------------
+class SqliteRateLimiter(SqliteStore):
+    # security.RateLimiter with its token buckets in the database, so every
+    # app process on the host (and every restart) enforces one limit. Rows
+    # old enough to have refilled completely are pruned now and then.
+    schema = RATE_LIMIT_SCHEMA
+
+    def __init__(self, path, capacity=5, rate=5 / 60, prune_every=1000):
+        self.capacity = capacity
+        self.rate = rate
+        self.prune_every = prune_every
+        self._calls = 0
+        super().__init__(path)
+
+    def allow(self, *keys):
+        # takes one token from every bucket, or none if any of them is empty
+        keys = [k for k in keys if k]
+        now = time.time()
+        self._calls += 1
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            levels = {}
+            for k in keys:
+                row = conn.execute("SELECT Tokens, Stamp FROM rate_buckets WHERE Key = ?", (k,)).fetchone()
+                tokens, stamp = (row[0], row[1]) if row else (self.capacity, now)
+                levels[k] = min(self.capacity, tokens + max(0.0, now - stamp) * self.rate)
+            ok = all(t >= 1 for t in levels.values())
+            conn.executemany(
+                "INSERT INTO rate_buckets (Key, Tokens, Stamp) VALUES (?, ?, ?) "
+                "ON CONFLICT (Key) DO UPDATE SET Tokens = excluded.Tokens, Stamp = excluded.Stamp",
+                [(k, t - 1 if ok else t, now) for k, t in levels.items()],
+            )
+            if self._calls % self.prune_every == 0:
+                conn.execute("DELETE FROM rate_buckets WHERE Stamp < ?", (now - self.capacity / self.rate,))
+        return ok
@@ -0,0 +1,85 @@
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+
+class WaterBuffer:
+    # Coalesces water clicks in memory. The latest (glasses, liters) per user
+    # and day wins, and pending values are written in one transaction when the
+    # debounce timer fires, when max_pending entries are waiting, or on an
+    # explicit flush() (page change, logout, shutdown). A value stays pending
+    # until its write has committed, so get() never falls between the two.
+    # A flush that fails leaves its values pending and is retried by the timer
+    # after another `delay`; close() makes a last flush on shutdown.
+    def __init__(self, store, delay=5.0, max_pending=50, on_flush=None, on_error=None):
+        self.store = store
+        self.on_flush = on_flush  # called with the (email, date) keys of each committed flush
+        self.on_error = on_error  # (exception) of a failed timer flush, before its retry
+        self.delay = delay
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # one flush at a time, so writes land in order
+        self._pending = {}
+        self._timer = None
+
+    def get(self, email, date):
+        with self._lock:
+            if (email, date) in self._pending:
+                return self._pending[(email, date)]
+        return self.store.get_water(email, date)
+
+    def record(self, email, date, glasses, liters):
+        with self._lock:
+            self._pending[(email, date)] = (glasses, liters)
+            full = len(self._pending) >= self.max_pending
+            if not full:
+                self._schedule()
+        if full:
+            self.flush()
+
+    def _schedule(self):
+        # under self._lock
+        if self._timer is None:
+            self._timer = threading.Timer(self.delay, self._timed_flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _timed_flush(self):
+        try:
+            self.flush()
+        except Exception as e:
+            log.exception("water flush failed, retrying in %ss", self.delay)
+            if self.on_error:
+                try:
+                    self.on_error(e)
+                except Exception:
+                    log.exception("water on_error callback failed")
+
+    def close(self):
+        # last flush on shutdown (flush() leaves no timer behind once it succeeds)
+        self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                pending = dict(self._pending)
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if not pending:
+                return
+            try:
+                self.store.set_water_many(pending)
+            except Exception:
+                # everything stays pending; the timer tries again
+                with self._lock:
+                    self._schedule()
+                raise
+            with self._lock:
+                # drop what was written, unless a newer click replaced it meanwhile
+                for key, value in pending.items():
+                    if self._pending.get(key) is value:
+                        del self._pending[key]
+            if self.on_flush:
+                self.on_flush(list(pending))
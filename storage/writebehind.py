@@ -0,0 +1,329 @@
+import datetime
+import os
+import queue
+import threading
+import time
+
+# kinds of queued mutation, applied in this order within a batch so an image
+# is in place before the user row that points at it
+IMAGE, USER, INTAKE, TOUCH = "image", "user", "intake", "touch"
+# on_error kind for an exception raised by the on_commit callback
+CALLBACK = "callback"
+_ORDER = (IMAGE, USER, INTAKE, TOUCH)
+_STOP = object()
+
+
+def touched(rec, day):
+    # the streak record a StreakStore holds after touch(email, day)
+    if rec is None:
+        return {"First": day.isoformat(), "Last": day.isoformat(), "Current": 1, "Longest": 1, "Active": 1}
+    last = datetime.date.fromisoformat(rec["Last"])
+    if day <= last:
+        return rec
+    current = rec["Current"] + 1 if (day - last).days == 1 else 1
+    return {**rec, "Last": day.isoformat(), "Current": current, "Longest": max(current, rec["Longest"]),
+            "Active": rec["Active"] + 1}
+
+
+class WriteBehind:
+    # Process-wide write-behind queue in front of a Storage. Sessions enqueue
+    # intake entries, streak touches, user updates and image puts and return
+    # at once; one worker thread drains the queue in batches of up to
+    # max_batch and writes each batch grouped (one add_many, one update per
+    # user, the last put per image key). The queue is bounded, so a stalled
+    # disk pushes back on writers instead of growing without limit.
+    #
+    # Until a mutation is committed it sits in an overlay, and the read
+    # helpers (for_day, user, streak, active_days, image) merge it over the
+    # stored value, so the session that wrote sees its write on the next
+    # rerun. Reads never wait for a commit. The overlay is copied under the
+    # lock before the store is read; a user update, streak touch or image
+    # applied twice gives the same result, so only intake rows need care.
+    # While a batch of rows is being added, the worker has recorded how many
+    # rows each (email, date) had before, and the number the store returns
+    # tells the reader how many of that batch are already in it (rows another
+    # process adds to the same day meanwhile are taken for the batch's until
+    # it commits, which can hide as many pending rows for that moment).
+    #
+    # data_version() is what caches key on. It pairs the store's version of a
+    # user, read at most once per version_ttl seconds (writes from other
+    # processes show up within that), with a count of this process's writes
+    # for the user, bumped when one is queued and again when it commits.
+    def __init__(self, storage, max_queue=10_000, max_batch=500, on_commit=None, on_error=None,
+                 version_ttl=10.0):
+        self.storage = storage
+        self.max_batch = max_batch
+        self.on_commit = on_commit  # (batch size, seconds, queue depth)
+        self.on_error = on_error  # (kind, exception): a dropped mutation, or CALLBACK
+        self.version_ttl = version_ttl
+        self._queue = queue.Queue(max_queue)
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._changes = 0  # bumped whenever rows start or stop being applied
+        self._intake = {}  # (email, date) -> [(seq, row)]
+        self._applying = {}  # (email, date) -> (seqs being added, stored rows before)
+        self._users = {}  # email -> (seq, merged updates)
+        self._touches = {}  # email -> (seq, latest day)
+        self._images = {}  # key -> (seq, data)
+        self._versions = {}  # email -> (stored version, time.monotonic() it was read)
+        self._written = {}  # email -> writes queued or committed by this process
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="nutra-write-behind", daemon=True)
+        self._thread.start()
+        return self
+
+    # -------------------- writes --------------------
+    def alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _put(self, kind, payload, remember, email=None):
+        if not self.alive():
+            raise RuntimeError("write-behind worker is not running")
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            remember(seq)
+            if email is not None:
+                self._written[email] = self._written.get(email, 0) + 1
+        self._queue.put((seq, kind, payload))
+
+    def add_intake(self, email, date, item, calories):
+        row = (email, date, item, calories)
+        self._put(INTAKE, row, lambda seq: self._intake.setdefault((email, date), []).append((seq, row)), email)
+
+    def update_user(self, email, updates):
+        def remember(seq):
+            merged = {**self._users.get(email, (0, {}))[1], **updates}
+            self._users[email] = (seq, merged)
+        self._put(USER, (email, dict(updates)), remember, email)
+
+    def touch(self, email, day):
+        def remember(seq):
+            _, pending = self._touches.get(email, (0, day))
+            self._touches[email] = (seq, max(pending, day))
+        self._put(TOUCH, (email, day), remember, email)
+
+    def changed(self, *emails):
+        # for writes made around the queue (water clicks, imports)
+        with self._lock:
+            for email in emails:
+                self._written[email] = self._written.get(email, 0) + 1
+
+    def put_image(self, key, data):
+        self._put(IMAGE, (key, data), lambda seq: self._images.__setitem__(key, (seq, data)))
+        return key
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def flush(self, timeout=None):
+        # Blocks until everything queued so far is committed (or dropped).
+        # Raises instead of waiting forever when the worker is gone, or when
+        # `timeout` seconds pass first.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        done = self._queue.all_tasks_done
+        with done:
+            while self._queue.unfinished_tasks:
+                if not self.alive():
+                    raise RuntimeError(
+                        f"write-behind worker is not running, {self._queue.unfinished_tasks} writes not committed"
+                    )
+                wait = 0.5 if deadline is None else min(0.5, deadline - time.monotonic())
+                if wait <= 0:
+                    raise TimeoutError(f"write-behind flush timed out, {self._queue.unfinished_tasks} writes pending")
+                done.wait(wait)
+
+    def close(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        self._thread = None
+
+    # -------------------- reads --------------------
+    def _read(self, load, pending):
+        # pending() from the overlay, then load() from the store: whatever
+        # left the overlay first is already in the store
+        with self._lock:
+            value = pending()
+        return load(), value
+
+    def for_day(self, email, date):
+        key = (email, date)
+        while True:
+            with self._lock:
+                changes = self._changes
+                rows = list(self._intake.get(key, []))
+                seqs, before = self._applying.get(key, ((), 0))
+            stored = self.storage.intake.for_day(email, date)
+            with self._lock:
+                if self._changes == changes:
+                    break
+            # a batch started or finished while the store was read: the count
+            # below would be off, so read again (this never waits on a commit)
+        if seqs:
+            # the batch commits in one transaction, so its rows are either all
+            # in `stored` or none are (a failed batch is retried row by row, in order)
+            done = min(max(len(stored) - before, 0), len(seqs))
+            skip = set(sorted(seqs)[:done])
+            rows = [(seq, row) for seq, row in rows if seq not in skip]
+        return stored + [dict(zip(("Email", "Date", "Item", "Calories"), row)) for _, row in rows]
+
+    def user(self, email):
+        rec, updates = self._read(lambda: self.storage.users.get(email),
+                                  lambda: self._users.get(email, (0, None))[1])
+        if rec is None or not updates:
+            return rec
+        return {**rec, **{k: "" if v is None else str(v) for k, v in updates.items() if k in rec and k != "Email"}}
+
+    def streak(self, email):
+        rec, day = self._read(lambda: self.storage.streaks.get(email), lambda: self._touches.get(email, (0, None))[1])
+        return rec if day is None else touched(rec, day)
+
+    def active_days(self, email, start, end):
+        days, day = self._read(lambda: self.storage.streaks.active_days(email, start, end),
+                               lambda: self._touches.get(email, (0, None))[1])
+        if day is not None and start <= day <= end and day not in days:
+            days = sorted([*days, day])
+        return days
+
+    def data_version(self, email):
+        # (stored version, local writes): changes with every write this process
+        # makes, and within version_ttl seconds of one made elsewhere
+        now = time.monotonic()
+        with self._lock:
+            cached = self._versions.get(email)
+        if cached is None or now - cached[1] >= self.version_ttl:
+            cached = (self.storage.intake.data_version(email), now)
+            with self._lock:
+                self._versions[email] = cached
+        with self._lock:
+            return cached[0], self._written.get(email, 0)
+
+    def image(self, key):
+        # (data, etag) of a pending put, or None when the store has the latest
+        with self._lock:
+            pending = self._images.get(key)
+        return (pending[1], f"pending-{pending[0]}") if pending else None
+
+    # -------------------- worker --------------------
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(op is _STOP for op in batch)
+            ops = [op for op in batch if op is not _STOP]
+            try:
+                if ops:
+                    self._commit(ops)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _commit(self, ops):
+        start = time.perf_counter()
+        ops.sort(key=lambda op: op[0])
+        failed_images = set()
+        try:
+            for kind in _ORDER:
+                group = [payload for _, k, payload in ops if k == kind]
+                if kind == USER and failed_images:
+                    group = self._skip_dependents(group, failed_images)
+                if not group:
+                    continue
+                if kind == INTAKE:
+                    self._start_intake([(seq, payload) for seq, k, payload in ops if k == INTAKE])
+                try:
+                    self._apply(kind, group)
+                except Exception:
+                    # one bad mutation must not sink its neighbours: retry
+                    # them one at a time and drop only what still fails
+                    for payload in group:
+                        try:
+                            self._apply(kind, [payload])
+                        except Exception as e:
+                            if kind == IMAGE:
+                                failed_images.add(payload[0])
+                            self._report(kind, e)
+        finally:
+            with self._lock:
+                self._forget({seq for seq, _, _ in ops})
+                self._applying.clear()
+                self._changes += 1
+                for email in {payload[0] for _, kind, payload in ops if kind != IMAGE}:
+                    self._written[email] = self._written.get(email, 0) + 1
+        if self.on_commit:
+            # a failing callback must not take the worker (and every queued write) down
+            try:
+                self.on_commit(len(ops), time.perf_counter() - start, self.depth())
+            except Exception as e:
+                self._report(CALLBACK, e)
+
+    def _start_intake(self, rows):
+        # how many rows each (email, date) had before this batch, for for_day
+        keys = {}
+        for seq, (email, date, _, _) in rows:
+            keys.setdefault((email, date), []).append(seq)
+        before = {key: len(self.storage.intake.for_day(*key)) for key in keys}
+        with self._lock:
+            self._applying = {key: (seqs, before[key]) for key, seqs in keys.items()}
+            self._changes += 1
+
+    def _skip_dependents(self, group, failed_images):
+        # a user update that points at a picture (or a thumbnail of one) whose
+        # put failed is dropped too, rather than leave the user on a missing key
+        stems = set()
+        for key in failed_images:
+            stem = os.path.splitext(key)[0]
+            stems.update((stem, stem.rsplit("_", 1)[0]))
+        kept = []
+        for email, updates in group:
+            missing = [v for v in updates.values() if isinstance(v, str) and v and os.path.splitext(v)[0] in stems]
+            if missing:
+                self._report(USER, RuntimeError(f"{email}: image {missing[0]} was not stored, update dropped"))
+            else:
+                kept.append((email, updates))
+        return kept
+
+    def _report(self, kind, error):
+        if self.on_error:
+            try:
+                self.on_error(kind, error)
+            except Exception:
+                pass
+
+    def _apply(self, kind, group):
+        if kind == INTAKE:
+            self.storage.intake.add_many(group)
+        elif kind == TOUCH:
+            for email, day in dict.fromkeys(group):
+                self.storage.streaks.touch(email, day)
+        elif kind == USER:
+            merged = {}
+            for email, updates in group:
+                merged.setdefault(email, {}).update(updates)
+            for email, updates in merged.items():
+                self.storage.users.update(email, updates)
+        elif kind == IMAGE:
+            for key, data in dict(group).items():
+                self.storage.images.put(key, data)
+
+    def _forget(self, done):
+        # drop the overlay entries of the ops in `done`; a merged user, touch
+        # or image entry stays while a newer op folded into it is still queued
+        for key in list(self._intake):
+            rows = [(seq, row) for seq, row in self._intake[key] if seq not in done]
+            if rows:
+                self._intake[key] = rows
+            else:
+                del self._intake[key]
+        for overlay in (self._users, self._touches, self._images):
+            for key in [k for k, (seq, _) in overlay.items() if seq in done]:
+                del overlay[key]
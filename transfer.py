@@ -0,0 +1,190 @@
+# Bulk CSV import and export of intake entries and water logs. Both directions
+# stream: imports read the file `chunksize` rows at a time and hand each
+# validated batch to the store (add_new / set_water_new skip what is already
+# stored), exports pull chunks from iter_intake / iter_water and emit CSV
+# text. Memory stays at one chunk however large the file is, and every batch
+# is its own short transaction, so other sessions keep writing meanwhile.
+#
+#   python transfer.py import intake|water FILE [--email EMAIL]
+#   python transfer.py export intake|water [--email EMAIL] [--out FILE]
+#
+# The command line uses the same NUTRA_* settings as main.py; without
+# --email, imports take each row's Email column and exports cover every user.
+import argparse
+import csv
+import io
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+from storage import INTAKE_COLS, WATER_COLS, CsvIntakeStore, IntakeArchive, IntakeStore
+
+IMPORT_CHUNK = 5_000
+EXPORT_CHUNK = 10_000
+# per entry; the app's own form stops at 5000
+MAX_CALORIES = 10_000
+MAX_GLASSES = 100
+MAX_LITERS = 20
+# glasses <-> liters when a file only has one of them (the app's default glass)
+GLASS_LITERS = 0.25
+
+
+def _columns(chunk):
+    # header names from other trackers: any case, surrounding blanks
+    return chunk.rename(columns={c: c.strip().title() for c in chunk.columns})
+
+
+def _dates(values):
+    dates = pd.to_datetime(values.str.strip(), errors="coerce", format="ISO8601")
+    return dates.dt.strftime("%Y-%m-%d")
+
+
+def _emails(chunk, email):
+    # a user's own import always lands on their account
+    if email is not None:
+        return pd.Series(email, index=chunk.index)
+    return chunk["Email"].str.strip() if "Email" in chunk else pd.Series("", index=chunk.index)
+
+
+def intake_rows(chunk, email=None):
+    # a chunk of raw CSV strings -> (valid (email, date, item, calories) rows, invalid count)
+    chunk = _columns(chunk)
+    if "Date" not in chunk or "Item" not in chunk or "Calories" not in chunk:
+        return [], len(chunk)
+    df = pd.DataFrame({
+        "Email": _emails(chunk, email),
+        "Date": _dates(chunk["Date"]),
+        "Item": chunk["Item"].str.strip(),
+        "Calories": pd.to_numeric(chunk["Calories"], errors="coerce"),
+    })
+    ok = (df["Email"].str.contains("@") & df["Date"].notna() & (df["Item"] != "")
+          & df["Calories"].between(0, MAX_CALORIES))
+    df = df[ok]
+    return list(zip(*(df[c].tolist() for c in INTAKE_COLS))), int((~ok).sum())
+
+
+def water_rows(chunk, email=None):
+    # a chunk of raw CSV strings -> ({(email, date): (glasses, liters)}, invalid count)
+    chunk = _columns(chunk)
+    if "Date" not in chunk or ("Glasses" not in chunk and "Liters" not in chunk):
+        return {}, len(chunk)
+    glasses = pd.to_numeric(chunk["Glasses"], errors="coerce") if "Glasses" in chunk else None
+    liters = pd.to_numeric(chunk["Liters"], errors="coerce") if "Liters" in chunk else None
+    if glasses is None:
+        glasses = (liters / GLASS_LITERS).round()
+    if liters is None:
+        liters = glasses * GLASS_LITERS
+    df = pd.DataFrame({"Email": _emails(chunk, email), "Date": _dates(chunk["Date"]), "Glasses": glasses, "Liters": liters})
+    ok = (df["Email"].str.contains("@") & df["Date"].notna() & df["Glasses"].between(0, MAX_GLASSES)
+          & df["Liters"].between(0, MAX_LITERS))
+    # the last row for a day wins, as in the app
+    df = df[ok]
+    entries = {(e, d): (int(g), float(l)) for e, d, g, l in zip(*(df[c].tolist() for c in WATER_COLS))}
+    return entries, int((~ok).sum())
+
+
+def _read_chunks(source, chunksize):
+    return pd.read_csv(source, chunksize=chunksize, dtype=str, keep_default_na=False, skipinitialspace=True)
+
+
+def import_intake(store, source, email=None, chunksize=IMPORT_CHUNK):
+    # source: a path or a binary/text file object with a header row
+    report = {"rows": 0, "added": 0, "duplicates": 0, "invalid": 0}
+    for chunk in _read_chunks(source, chunksize):
+        rows, invalid = intake_rows(chunk, email)
+        added = store.add_new(rows) if rows else 0
+        report["rows"] += len(chunk)
+        report["invalid"] += invalid
+        report["added"] += added
+        report["duplicates"] += len(rows) - added
+    return report
+
+
+def import_water(store, source, email=None, chunksize=IMPORT_CHUNK):
+    # days that already have a value are kept and counted as duplicates
+    report = {"rows": 0, "added": 0, "duplicates": 0, "invalid": 0}
+    for chunk in _read_chunks(source, chunksize):
+        entries, invalid = water_rows(chunk, email)
+        added = store.set_water_new(entries) if entries else 0
+        report["rows"] += len(chunk)
+        report["invalid"] += invalid
+        report["added"] += added
+        report["duplicates"] += len(chunk) - invalid - added
+    return report
+
+
+def _number(value):
+    # 100 and 100.0 come back from different places (hot table, archive)
+    return f"{value:g}" if isinstance(value, float) else value
+
+
+def csv_chunks(header, chunks):
+    # CSV text for the header, then one string per chunk of row tuples
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    writer.writerow(header)
+    yield buf.getvalue()
+    for rows in chunks:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows(tuple(_number(v) for v in row) for row in rows)
+        yield buf.getvalue()
+
+
+def export_intake(store, email=None, chunksize=EXPORT_CHUNK):
+    return csv_chunks(INTAKE_COLS, store.iter_intake(email, chunksize))
+
+
+def export_water(store, email=None, chunksize=EXPORT_CHUNK):
+    return csv_chunks(WATER_COLS, store.iter_water(email, chunksize))
+
+
+def spool(text_chunks, max_memory=8 << 20):
+    # a download button needs a file object: small exports stay in memory,
+    # larger ones spill to a temp file as they are written
+    f = tempfile.SpooledTemporaryFile(max_size=max_memory)
+    for text in text_chunks:
+        f.write(text.encode("utf-8"))
+    f.seek(0)
+    return f
+
+
+def open_intake_store():
+    if os.environ.get("NUTRA_STORAGE", "sqlite") == "csv":
+        return CsvIntakeStore("intake.csv", "water.csv")
+    archive_dir = os.environ.get("NUTRA_ARCHIVE_DIR", "archive")
+    return IntakeStore(os.environ.get("NUTRA_DB_PATH", "nutra.db"),
+                       IntakeArchive(archive_dir) if IntakeArchive.available() else None)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk CSV import/export of intake and water logs")
+    parser.add_argument("action", choices=["import", "export"])
+    parser.add_argument("kind", choices=["intake", "water"])
+    parser.add_argument("file", nargs="?", help="CSV file to import")
+    parser.add_argument("--email", help="only this user (imports: assign every row to them)")
+    parser.add_argument("--out", help="export to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    store = open_intake_store()
+    if args.action == "import":
+        if not args.file:
+            parser.error("import needs a FILE")
+        run = import_intake if args.kind == "intake" else import_water
+        print(run(store, args.file, args.email))
+        return 0
+    run = export_intake if args.kind == "intake" else export_water
+    out = open(args.out, "w", newline="") if args.out else sys.stdout
+    try:
+        for text in run(store, args.email):
+            out.write(text)
+    finally:
+        if args.out:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())